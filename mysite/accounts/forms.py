@@ -0,0 +1,27 @@
+from django.contrib.auth.forms import AuthenticationForm
+from django.core.exceptions import ValidationError
+
+from .hashing import aauthenticate
+
+
+class AsyncAuthenticationForm(AuthenticationForm):
+    """
+    AuthenticationForm that checks the password with aauthenticate() rather
+    than in clean(), so the hashing runs off the event loop.
+    """
+
+    def clean(self):
+        return self.cleaned_data
+
+    async def aauthenticate(self):
+        self.user_cache = await aauthenticate(self.request, self.cleaned_data['username'],
+                                              self.cleaned_data['password'])
+        if self.user_cache is None:
+            self.add_error(None, self.get_invalid_login_error())
+            return False
+        try:
+            self.confirm_login_allowed(self.user_cache)
+        except ValidationError as e:
+            self.add_error(None, e)
+            return False
+        return True
@@ -0,0 +1,101 @@
+"""
+Password hashing off the request worker.
+
+PBKDF2 takes tens of milliseconds of CPU per password. The async views in
+accounts.views run it in a bounded thread pool instead of on the event loop;
+hashlib releases the GIL while hashing, so the pool uses every core. The
+pool size is ACCOUNTS_HASHING_WORKERS (one thread per core by default).
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model, load_backend
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.signals import user_login_failed
+from django.core.exceptions import PermissionDenied
+
+# What authenticate() puts in place of the password in user_login_failed.
+MASKED_PASSWORD = '*' * 20
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'ACCOUNTS_HASHING_WORKERS', None) or os.cpu_count() or 1
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        return _executor
+
+
+async def run_in_pool(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), function, *args)
+
+
+async def amake_password(password):
+    return await run_in_pool(make_password, password)
+
+
+async def acheck_password(password, encoded, setter=None):
+    return await run_in_pool(check_password, password, encoded, setter)
+
+
+async def amodel_authenticate(backend, username, password):
+    """
+    ModelBackend.authenticate() with the password checked, and upgraded when
+    its hasher changed, in the hashing pool.
+    """
+    if username is None or password is None:
+        return None
+    user_model = get_user_model()
+    try:
+        user = await user_model._default_manager.aget(**{user_model.USERNAME_FIELD: username})
+    except user_model.DoesNotExist:
+        # Hash anyway so that missing users take as long as wrong passwords.
+        await amake_password(password)
+        return None
+    upgraded = []
+
+    def setter(raw_password):
+        # Runs in the pool: hash there, save from the event loop below.
+        user.set_password(raw_password)
+        user._password = None
+        upgraded.append(True)
+
+    if not await acheck_password(password, user.password, setter):
+        return None
+    if upgraded:
+        await user.asave(update_fields=['password'])
+    return user if backend.user_can_authenticate(user) else None
+
+
+async def aauthenticate(request, username, password):
+    """
+    Async counterpart of authenticate(): try every AUTHENTICATION_BACKENDS
+    entry and return the user with these credentials, or None after sending
+    user_login_failed. Backends keeping ModelBackend.authenticate() check the
+    password in the hashing pool.
+    """
+    for backend_path in settings.AUTHENTICATION_BACKENDS:
+        backend = load_backend(backend_path)
+        try:
+            if type(backend).authenticate is ModelBackend.authenticate:
+                user = await amodel_authenticate(backend, username, password)
+            else:
+                user = await sync_to_async(backend.authenticate)(request, username=username, password=password)
+        except PermissionDenied:
+            # This backend says to stop in our tracks.
+            break
+        if user is not None:
+            user.backend = backend_path
+            return user
+    await sync_to_async(user_login_failed.send)(
+        sender=__name__, credentials={'username': username, 'password': MASKED_PASSWORD}, request=request)
+    return None
@@ -0,0 +1,79 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+
+def setup_worker():
+    # Workers started with "spawn" have to load the settings and apps themselves.
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Creates users in bulk from a CSV file with username, email and password columns, ' \
+           'hashing the passwords in parallel on every core.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='CSV file with a header row: username,email,password.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Number of hashing processes, one per core by default.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of users inserted per query.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_file'], newline='') as csv_file:
+                rows = list(csv.DictReader(csv_file))
+        except OSError as e:
+            raise CommandError(e)
+        if rows and not {'username', 'password'} <= set(rows[0]):
+            raise CommandError('The CSV file needs username and password columns.')
+
+        user_model = get_user_model()
+        valid_rows = []
+        for number, row in enumerate(rows, start=1):
+            user = user_model(username=row['username'] or '', email=row.get('email') or '')
+            try:
+                # Checks blank values, lengths and the username validators
+                # without a query, so one bad row cannot abort the insert.
+                user.clean_fields(exclude=['password'])
+                if not row['password']:
+                    raise ValidationError({'password': 'This field cannot be blank.'})
+            except ValidationError as e:
+                self.stderr.write('Row %d (%r): %s' % (number, row['username'], '; '.join(
+                    '%s: %s' % (field, ' '.join(messages)) for field, messages in e.message_dict.items())))
+                continue
+            valid_rows.append(row)
+
+        usernames = [row['username'] for row in valid_rows]
+        existing = set(user_model._default_manager.filter(username__in=usernames)
+                       .values_list('username', flat=True))
+        seen = set()
+        new_rows = []
+        for row in valid_rows:
+            if row['username'] in existing or row['username'] in seen:
+                continue
+            seen.add(row['username'])
+            new_rows.append(row)
+
+        passwords = [row['password'] for row in new_rows]
+        if options['workers'] > 1 and len(passwords) > 1:
+            chunksize = max(1, len(passwords) // (options['workers'] * 4))
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=setup_worker) as executor:
+                hashes = list(executor.map(make_password, passwords, chunksize=chunksize))
+        else:
+            hashes = [make_password(password) for password in passwords]
+
+        users = [user_model(username=row['username'], email=row.get('email') or '', password=encoded)
+                 for row, encoded in zip(new_rows, hashes)]
+        with transaction.atomic():
+            user_model._default_manager.bulk_create(users, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Created %d users, skipped %d existing usernames and %d invalid rows.' % (
+                len(users), len(valid_rows) - len(users), len(rows) - len(valid_rows))))
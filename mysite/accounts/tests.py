@@ -1,3 +1,184 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import BaseBackend, ModelBackend
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.signals import user_login_failed
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+User = get_user_model()
+
+
+class EmailBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = User.objects.filter(email=username).first()
+        if user is not None and user.check_password(password) and self.user_can_authenticate(user):
+            return user
+
+
+class StudentBackend(BaseBackend):
+    def authenticate(self, request, username=None, password=None):
+        if password == 'let-me-in':
+            return User.objects.filter(username=username).first()
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncSignUpViewTest(TestCase):
+    async def test_signup(self):
+        """
+        Signing up creates the user with a hashed password and redirects to login.
+        """
+        response = await self.async_client.post(reverse('signup'), {
+            'username': 'student', 'password1': 'a-long-pass-phrase', 'password2': 'a-long-pass-phrase'})
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        user = await User.objects.aget(username='student')
+        self.assertTrue(check_password('a-long-pass-phrase', user.password))
+
+    async def test_signup_invalid(self):
+        """
+        Mismatching passwords redisplay the form without creating a user.
+        """
+        response = await self.async_client.post(reverse('signup'), {
+            'username': 'student', 'password1': 'a-long-pass-phrase', 'password2': 'another-pass-phrase'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(await User.objects.filter(username='student').aexists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncLoginViewTest(TestCase):
+    def setUp(self):
+        User.objects.create_user('student', password='a-long-pass-phrase')
+
+    def test_login(self):
+        """
+        Valid credentials log the user in and redirect home.
+        """
+        response = self.client.post(reverse('login'), {'username': 'student', 'password': 'a-long-pass-phrase'})
+        self.assertRedirects(response, reverse('home'))
+        self.assertIn('_auth_user_id', self.client.session)
+
+    def test_wrong_password(self):
+        """
+        A wrong password redisplays the form with an error.
+        """
+        response = self.client.post(reverse('login'), {'username': 'student', 'password': 'wrong'})
+        self.assertContains(response, 'Please enter a correct username and password')
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_unknown_user(self):
+        """
+        An unknown username is rejected like a wrong password.
+        """
+        response = self.client.post(reverse('login'), {'username': 'nobody', 'password': 'a-long-pass-phrase'})
+        self.assertContains(response, 'Please enter a correct username and password')
+
+    def test_login_failed_signal(self):
+        """
+        A failed login sends user_login_failed without the password.
+        """
+        failures = []
+
+        def receiver(sender, credentials, **kwargs):
+            failures.append(credentials)
+
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        self.client.post(reverse('login'), {'username': 'student', 'password': 'wrong'})
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0]['username'], 'student')
+        self.assertNotEqual(failures[0]['password'], 'wrong')
+
+    @override_settings(AUTHENTICATION_BACKENDS=['accounts.tests.StudentBackend'])
+    def test_authentication_backends(self):
+        """
+        The configured authentication backends are used.
+        """
+        response = self.client.post(reverse('login'), {'username': 'student', 'password': 'a-long-pass-phrase'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('login'), {'username': 'student', 'password': 'let-me-in'})
+        self.assertRedirects(response, reverse('home'))
+        self.assertEqual(self.client.session['_auth_user_backend'], 'accounts.tests.StudentBackend')
+
+    @override_settings(AUTHENTICATION_BACKENDS=['accounts.tests.EmailBackend'])
+    def test_model_backend_subclass(self):
+        """
+        A ModelBackend subclass overriding authenticate() is called as it is.
+        """
+        User.objects.filter(username='student').update(email='student@example.com')
+        response = self.client.post(reverse('login'), {'username': 'student@example.com',
+                                                       'password': 'a-long-pass-phrase'})
+        self.assertRedirects(response, reverse('home'))
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.SHA1PasswordHasher',
+                                         'django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_password_upgraded(self):
+        """
+        Logging in rehashes a password stored with an older hasher.
+        """
+        self.client.post(reverse('login'), {'username': 'student', 'password': 'a-long-pass-phrase'})
+        password = User.objects.get(username='student').password
+        self.assertTrue(password.startswith('sha1$'))
+        self.assertTrue(check_password('a-long-pass-phrase', password))
+
+    def test_never_cached(self):
+        """
+        The login page is never cached.
+        """
+        response = self.client.get(reverse('login'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersTest(TestCase):
+    def test_import(self):
+        """
+        Users are created from the CSV file and existing usernames are skipped.
+        """
+        User.objects.create_user('existing', password='a-long-pass-phrase')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.csv')
+            with open(path, 'w') as csv_file:
+                csv_file.write('username,email,password\n'
+                               'existing,existing@example.com,pass-phrase-1\n'
+                               'alice,alice@example.com,pass-phrase-2\n'
+                               'bob,bob@example.com,pass-phrase-3\n')
+            call_command('import_users', path, workers=1, stdout=io.StringIO())
+        self.assertEqual(User.objects.count(), 3)
+        self.assertTrue(User.objects.get(username='bob').check_password('pass-phrase-3'))
+        self.assertTrue(User.objects.get(username='existing').check_password('a-long-pass-phrase'))
+
+    def test_missing_email(self):
+        """
+        Rows without an email get an empty one.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.csv')
+            with open(path, 'w') as csv_file:
+                csv_file.write('username,password,email\n'
+                               'alice,pass-phrase-1,alice@example.com\n'
+                               'bob,pass-phrase-2\n')
+            call_command('import_users', path, workers=1, stdout=io.StringIO())
+        self.assertEqual(User.objects.get(username='bob').email, '')
+
+    def test_invalid_rows_reported(self):
+        """
+        Rows with a bad username or no password are reported and skipped.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.csv')
+            with open(path, 'w') as csv_file:
+                csv_file.write('username,email,password\n'
+                               '%s,long@example.com,pass-phrase-1\n'
+                               'bad name!,bad@example.com,pass-phrase-2\n'
+                               ',blank@example.com,pass-phrase-3\n'
+                               'nopass,nopass@example.com,\n'
+                               'alice,alice@example.com,pass-phrase-4\n' % ('x' * 200))
+            errors = io.StringIO()
+            call_command('import_users', path, workers=1, stdout=io.StringIO(), stderr=errors)
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['alice'])
+        self.assertEqual(len(errors.getvalue().splitlines()), 4)
+        self.assertIn('Row 4', errors.getvalue())
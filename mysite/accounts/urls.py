@@ -1,8 +1,9 @@
 from django.urls import path
 
-from .views import SignUpView
+from .views import AsyncLoginView, AsyncSignUpView
 
 
 urlpatterns = [
-    path("signup/", SignUpView.as_view(), name="signup"),
-]
\ No newline at end of file
+    path("login/", AsyncLoginView.as_view(), name="login"),
+    path("signup/", AsyncSignUpView.as_view(), name="signup"),
+]
@@ -1,10 +1,68 @@
 # accounts/views.py
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
+from django.shortcuts import redirect, render, resolve_url
 from django.urls import reverse_lazy
+from django.utils.cache import add_never_cache_headers
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import generic
 
+from .forms import AsyncAuthenticationForm
+from .hashing import amake_password
 
-class SignUpView(generic.CreateView):
+
+class AsyncSignUpView(generic.View):
+    """
+    Sign up view hashing the password in the hashing pool.
+    """
     form_class = UserCreationForm
     success_url = reverse_lazy("login")
     template_name = "registration/signup.html"
+
+    async def get(self, request):
+        return render(request, self.template_name, {"form": self.form_class()})
+
+    async def post(self, request):
+        form = self.form_class(request.POST)
+        # Validation checks the username is free, which queries the database.
+        if not await sync_to_async(form.is_valid)():
+            return render(request, self.template_name, {"form": form})
+        user = form.instance
+        user.password = await amake_password(form.cleaned_data["password1"])
+        await user.asave()
+        return redirect(self.success_url)
+
+
+class AsyncLoginView(generic.View):
+    """
+    Log in view checking the password in the hashing pool.
+    """
+    form_class = AsyncAuthenticationForm
+    template_name = "registration/login.html"
+
+    async def dispatch(self, request, *args, **kwargs):
+        # What sensitive_post_parameters() and never_cache do for LoginView;
+        # those decorators only wrap sync views in this Django version.
+        request.sensitive_post_parameters = "__ALL__"
+        response = await super().dispatch(request, *args, **kwargs)
+        add_never_cache_headers(response)
+        return response
+
+    async def get(self, request):
+        return render(request, self.template_name, {"form": self.form_class(request)})
+
+    async def post(self, request):
+        form = self.form_class(request, data=request.POST)
+        if not form.is_valid() or not await form.aauthenticate():
+            return render(request, self.template_name, {"form": form})
+        await sync_to_async(login)(request, form.get_user())
+        return redirect(self.get_success_url(request))
+
+    def get_success_url(self, request):
+        url = request.POST.get("next", request.GET.get("next", ""))
+        if url_has_allowed_host_and_scheme(url, allowed_hosts={request.get_host()},
+                                           require_https=request.is_secure()):
+            return url
+        return resolve_url(settings.LOGIN_REDIRECT_URL)
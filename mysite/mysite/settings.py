@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/4.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
+import os
 import sys
 from pathlib import Path
 
@@ -26,6 +27,10 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# "development" or "production". Production leaves out the development-only apps
+# and warms up every worker before it serves its first request (see polls/warmup.py).
+DJANGO_ENV = os.environ.get('DJANGO_ENV', 'development')
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -36,12 +41,20 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'django_extensions',
     "accounts",
 ]
 
+DEVELOPMENT_APPS = [
+    'django_extensions',
+]
+
+if DJANGO_ENV == 'development':
+    INSTALLED_APPS += DEVELOPMENT_APPS
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'polls.middleware.ProfilingMiddleware',
+    'polls.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -137,5 +150,52 @@ LOGOUT_REDIRECT_URL = "home"
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = BASE_DIR / "sent_emails"
 
+# Threads hashing passwords for the async login and sign up views (one per core when None).
+ACCOUNTS_HASHING_WORKERS = None
+
+# Responses smaller than this, or of other content types, are sent uncompressed.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_CONTENT_TYPES = ['text/html', 'text/css', 'text/plain', 'application/javascript', 'application/json']
+
+# Listings with more movies than this are streamed to the client (under WSGI only; Django 4.2
+# buffers sync streaming responses under ASGI).
+POLLS_STREAM_THRESHOLD = 500
+
+# Seconds the index facet counts are cached. Changes invalidate them at once only in
+# the worker that made them, unless CACHES points to a cache shared by all workers.
+POLLS_FACETS_CACHE_TIMEOUT = 60
+
+# Serve the movie listings from an in-process copy of the catalog (see polls/catalog.py).
+POLLS_CATALOG = False
+POLLS_CATALOG_SNAPSHOT = None
+POLLS_CATALOG_REFRESH_INTERVAL = 5
+
+# Requests sent with an "X-Profile-Token: <POLLS_PROFILE_TOKEN>" header, plus a
+# POLLS_PROFILE_SAMPLE_RATE share of all requests, are profiled into POLLS_PROFILE_DIR.
+POLLS_PROFILE_TOKEN = None
+POLLS_PROFILE_SAMPLE_RATE = 0
+POLLS_PROFILE_DIR = BASE_DIR / "profiles"
+POLLS_PROFILE_KEEP = 200
+
+# Push live results to the results page. Needs the ASGI application (mysite.asgi).
+POLLS_LIVE_RESULTS = False
+# Seconds between two reads of the watched results, and between two keep-alive comments.
+POLLS_LIVE_RESULTS_INTERVAL = 1
+POLLS_LIVE_RESULTS_KEEPALIVE = 15
+# Seconds after which a stream is closed and the browser asked to reconnect.
+POLLS_LIVE_RESULTS_LIFETIME = 300
+
+# Load templates, URL patterns and the catalog when a worker starts instead of on its first request.
+POLLS_WARM_UP = os.environ.get('POLLS_WARM_UP', '1' if DJANGO_ENV == 'production' else '0') == '1'
+
 if 'test' in sys.argv:
-    DATABASES['default'] = DATABASES['test']
+    # DJANGO_TEST_DATABASE=sqlite runs the tests on an in-memory SQLite database instead of MySQL.
+    if os.environ.get('DJANGO_TEST_DATABASE') == 'sqlite':
+        DATABASES = {
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': ':memory:',
+            },
+        }
+    else:
+        DATABASES['default'] = DATABASES['test']
@@ -0,0 +1,334 @@
+"""
+In-process snapshot of the movie catalog for the hot listing paths.
+
+The catalog keeps the listing fields of every movie in column-wise arrays and
+hands out light __slots__ records instead of model instances, so the index
+and the listing API can be served without touching the database. It is
+loaded from the database or from a memory-mapped snapshot file (written by
+the catalog_snapshot management command) and kept up to date from the
+CatalogChange table, which is written whenever a movie is saved or deleted.
+
+Markers are written once the change has committed, but concurrent commits can
+still become visible out of id order, so every refresh re-reads the last
+CHANGE_WINDOW markers and applies the ones it has not seen yet.
+
+Enable it with POLLS_CATALOG = True. POLLS_CATALOG_SNAPSHOT is the optional
+snapshot path and POLLS_CATALOG_REFRESH_INTERVAL the number of seconds
+between two checks for changes.
+"""
+import datetime
+import mmap
+import struct
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .facets import SCORE_BANDS, VOTE_THRESHOLDS
+from .models import CatalogChange, Movie
+
+MAGIC = b'POLLSCAT1'
+HEADER = struct.Struct('<9sqq')
+# Processes that did not look for changes for longer than this reload the
+# whole catalog, as the change markers they missed may have been pruned.
+CHANGE_RETENTION = datetime.timedelta(days=1)
+# Number of markers below the newest one seen that are read again on refresh.
+CHANGE_WINDOW = 100
+# Seconds between two deletions of the markers older than CHANGE_RETENTION by
+# each process, so the table stays small with or without snapshots.
+PRUNE_INTERVAL = 60 * 60
+FIELDS = ('id', 'title', 'release_date', 'image', 'score', 'vote_count')
+
+
+def enabled():
+    return getattr(settings, 'POLLS_CATALOG', False)
+
+
+def mark_changed(movie_ids):
+    """
+    Record that the given movies were added, changed or deleted, once the
+    current transaction commits.
+    """
+    if enabled():
+        changes = [CatalogChange(movie_id=movie_id) for movie_id in movie_ids]
+        transaction.on_commit(lambda: CatalogChange.objects.bulk_create(changes))
+
+
+def prune_changes():
+    """
+    Delete the change markers older than CHANGE_RETENTION. Returns the number
+    of markers deleted.
+    """
+    pruned, _ = CatalogChange.objects.filter(changed__lt=timezone.now() - CHANGE_RETENTION).delete()
+    return pruned
+
+
+class MovieRecord:
+    __slots__ = FIELDS
+
+    def __init__(self, id, title, release_date, image, score, vote_count):
+        self.id = id
+        self.title = title
+        self.release_date = release_date
+        self.image = image
+        self.score = score
+        self.vote_count = vote_count
+
+    def __str__(self):
+        return self.title
+
+    def __repr__(self):
+        return '<MovieRecord: %s>' % self.title
+
+
+class Catalog:
+    def __init__(self):
+        self.version = 0
+        self.seen = set()
+        self.ids = array('q')
+        self.released = array('d')
+        self.years = array('h')
+        self.scores = array('d')
+        self.vote_counts = array('q')
+        self.titles = []
+        self.images = []
+        self.rows = {}
+        self.alive = bytearray()
+        self.order = []
+        self.records = {}
+        self.facet_cache = {}
+        self.checked_at = time.monotonic()
+        self.pruned_at = None
+        self.lock = threading.RLock()
+
+    # Loading
+
+    @classmethod
+    def from_db(cls):
+        catalog = cls()
+        catalog.seen = set(CatalogChange.objects.order_by('-id').values_list('id', flat=True)[:CHANGE_WINDOW])
+        catalog.version = max(catalog.seen, default=0)
+        for values in Movie.objects.values_list(*FIELDS).iterator(chunk_size=2000):
+            catalog.append(*values)
+        catalog.reorder()
+        return catalog
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """
+        Load a snapshot file. The numeric columns stay backed by the memory
+        map, so workers loading the same file share its pages until they
+        apply their first change.
+        """
+        catalog = cls()
+        with open(path, 'rb') as snapshot:
+            data = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, catalog.version, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('%s is not a catalog snapshot' % path)
+        view = memoryview(data)
+        offset = HEADER.size
+        columns = []
+        for typecode in 'qddq':
+            size = array(typecode).itemsize * count
+            columns.append(view[offset:offset + size].cast(typecode))
+            offset += size
+        catalog.ids, catalog.released, catalog.scores, catalog.vote_counts = columns
+        for name in ('titles', 'images'):
+            strings = []
+            lengths = view[offset:offset + 8 * count].cast('q')
+            offset += 8 * count
+            for length in lengths:
+                strings.append(bytes(view[offset:offset + length]).decode('utf-8'))
+                offset += length
+            setattr(catalog, name, strings)
+        catalog.years = array('h', (year_of(released) for released in catalog.released))
+        catalog.rows = {movie_id: row for row, movie_id in enumerate(catalog.ids)}
+        catalog.alive = bytearray(b'\x01' * count)
+        catalog.reorder()
+        return catalog
+
+    def save_snapshot(self, path):
+        with self.lock:
+            live = [row for row in range(len(self.ids)) if self.alive[row]]
+            titles = [self.titles[row].encode('utf-8') for row in live]
+            images = [self.images[row].encode('utf-8') for row in live]
+            with open(path, 'wb') as snapshot:
+                snapshot.write(HEADER.pack(MAGIC, self.version, len(live)))
+                for column in (self.ids, self.released, self.scores, self.vote_counts):
+                    array(column.format if isinstance(column, memoryview) else column.typecode,
+                          (column[row] for row in live)).tofile(snapshot)
+                for strings in (titles, images):
+                    array('q', (len(value) for value in strings)).tofile(snapshot)
+                    snapshot.write(b''.join(strings))
+
+    # Changes
+
+    def append(self, movie_id, title, release_date, image, score, vote_count):
+        self.rows[movie_id] = len(self.ids)
+        self.ids.append(movie_id)
+        self.released.append(release_date.timestamp())
+        self.years.append(release_date.year)
+        self.scores.append(score)
+        self.vote_counts.append(vote_count)
+        self.titles.append(title)
+        self.images.append(image)
+        self.alive.append(1)
+
+    def writable(self):
+        # Columns loaded from a snapshot are read-only views of the file.
+        for name in ('ids', 'released', 'scores', 'vote_counts'):
+            column = getattr(self, name)
+            if isinstance(column, memoryview):
+                setattr(self, name, array(column.format, column))
+
+    def update(self, movie_id, title, release_date, image, score, vote_count):
+        row = self.rows.get(movie_id)
+        if row is None:
+            self.append(movie_id, title, release_date, image, score, vote_count)
+            return
+        self.released[row] = release_date.timestamp()
+        self.years[row] = release_date.year
+        self.scores[row] = score
+        self.vote_counts[row] = vote_count
+        self.titles[row] = title
+        self.images[row] = image
+        self.alive[row] = 1
+        self.records.pop(row, None)
+
+    def remove(self, movie_id):
+        row = self.rows.get(movie_id)
+        if row is not None:
+            self.alive[row] = 0
+            self.records.pop(row, None)
+
+    def reorder(self):
+        released = self.released
+        self.order = sorted((row for row in range(len(self.ids)) if self.alive[row]),
+                            key=lambda row: released[row], reverse=True)
+        self.facet_cache = {}
+
+    def refresh(self):
+        """
+        Apply the changes recorded since the catalog was loaded, pruning old
+        markers every PRUNE_INTERVAL seconds. Returns the number of movies
+        updated.
+        """
+        with self.lock:
+            if self.pruned_at is None or time.monotonic() - self.pruned_at > PRUNE_INTERVAL:
+                prune_changes()
+                self.pruned_at = time.monotonic()
+            recent = CatalogChange.objects.filter(id__gt=self.version - CHANGE_WINDOW).values_list('id', 'movie_id')
+            changes = [(change_id, movie_id) for change_id, movie_id in recent if change_id not in self.seen]
+            self.checked_at = time.monotonic()
+            if not changes:
+                return 0
+            self.writable()
+            changed = {movie_id for _, movie_id in changes}
+            found = set()
+            for values in Movie.objects.filter(id__in=changed).values_list(*FIELDS):
+                self.update(*values)
+                found.add(values[0])
+            for movie_id in changed - found:
+                self.remove(movie_id)
+            self.version = max(self.version, max(change_id for change_id, _ in changes))
+            self.seen = {change_id for change_id in self.seen | {change_id for change_id, _ in changes}
+                         if change_id > self.version - CHANGE_WINDOW}
+            self.reorder()
+            return len(changed)
+
+    # Reading
+
+    def record(self, row):
+        record = self.records.get(row)
+        if record is None:
+            record = self.records[row] = MovieRecord(
+                self.ids[row], self.titles[row],
+                datetime.datetime.fromtimestamp(self.released[row], datetime.timezone.utc),
+                self.images[row], self.scores[row], self.vote_counts[row])
+        return record
+
+    def get(self, movie_id):
+        row = self.rows.get(movie_id)
+        if row is not None and self.alive[row]:
+            return self.record(row)
+
+    def matching_rows(self, filters, exclude=None, now=None):
+        now = (now or timezone.now()).timestamp()
+        released, years, scores, vote_counts = self.released, self.years, self.scores, self.vote_counts
+        year = filters.get('year') if exclude != 'year' else None
+        band = filters.get('score') if exclude != 'score' else None
+        low, high = next(((low, high) for key, low, high in SCORE_BANDS if key == band), (None, None))
+        min_votes = filters.get('min_votes') if exclude != 'min_votes' else None
+        return [row for row in self.order
+                if released[row] <= now
+                and (year is None or years[row] == year)
+                and (low is None or low <= scores[row] and (high is None or scores[row] < high))
+                and (min_votes is None or vote_counts[row] >= min_votes)]
+
+    def movies(self, filters=None, now=None):
+        """
+        Return the published movies matching the filters, newest first.
+        """
+        return [self.record(row) for row in self.matching_rows(filters or {}, now=now)]
+
+    def facet_counts(self, filters):
+        """
+        Same counts as polls.facets.facet_counts(), computed from the columns.
+        """
+        key = tuple(sorted(filters.items()))
+        facets = self.facet_cache.get(key)
+        if facets is not None:
+            return facets
+        years = {}
+        for row in self.matching_rows(filters, exclude='year'):
+            years[self.years[row]] = years.get(self.years[row], 0) + 1
+        scores = [self.scores[row] for row in self.matching_rows(filters, exclude='score')]
+        votes = [self.vote_counts[row] for row in self.matching_rows(filters, exclude='min_votes')]
+        facets = self.facet_cache[key] = {
+            'year': sorted(years.items(), reverse=True),
+            'score': [(band, sum(1 for score in scores if low <= score and (high is None or score < high)))
+                      for band, low, high in SCORE_BANDS],
+            'min_votes': [(threshold, sum(1 for count in votes if count >= threshold))
+                          for threshold in VOTE_THRESHOLDS],
+        }
+        return facets
+
+
+def year_of(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).year
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    Return the process-wide catalog, loading it on first use and applying
+    pending changes at most every POLLS_CATALOG_REFRESH_INTERVAL seconds.
+    """
+    global _catalog
+    with _catalog_lock:
+        if _catalog is not None and time.monotonic() - _catalog.checked_at > CHANGE_RETENTION.total_seconds():
+            _catalog = None
+        if _catalog is None:
+            path = getattr(settings, 'POLLS_CATALOG_SNAPSHOT', None)
+            try:
+                _catalog = Catalog.from_snapshot(path) if path else Catalog.from_db()
+            except FileNotFoundError:
+                _catalog = Catalog.from_db()
+            return _catalog
+        catalog = _catalog
+    if time.monotonic() - catalog.checked_at > getattr(settings, 'POLLS_CATALOG_REFRESH_INTERVAL', 5):
+        catalog.refresh()
+    return catalog
+
+
+def reset():
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
@@ -0,0 +1,137 @@
+"""
+Filters and facet counts for browsing the movie index.
+
+The index can be narrowed by release year, score band and minimum vote count.
+Next to every option we show how many movies it would leave, given the other
+active filters. Each facet is computed with a single grouped or conditional
+aggregate query and the result is cached until a movie changes.
+
+Invalidation goes through the default cache. With the per-process LocMemCache
+other workers only see a change when their entry expires, after
+POLLS_FACETS_CACHE_TIMEOUT seconds; configure a shared cache (memcached,
+Redis) in CACHES to make it immediate.
+"""
+import datetime
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import ExtractYear
+
+SCORE_BANDS = [
+    ('0-2', 0, 2),
+    ('2-4', 2, 4),
+    ('4-6', 4, 6),
+    ('6-8', 6, 8),
+    ('8-10', 8, None),
+]
+VOTE_THRESHOLDS = [10, 100, 1000, 5000, 10000]
+
+MAX_VOTES = 2 ** 31 - 1
+VERSION_KEY = 'polls:facets:version'
+
+
+def parse_filters(params):
+    """
+    Return the valid filters of a GET QueryDict; invalid values are ignored.
+    """
+    filters = {}
+    year = parse_int(params, 'year', datetime.MINYEAR, datetime.MAXYEAR)
+    if year is not None:
+        filters['year'] = year
+    if params.get('score') in {key for key, _, _ in SCORE_BANDS}:
+        filters['score'] = params['score']
+    min_votes = parse_int(params, 'min_votes', 0, MAX_VOTES)
+    if min_votes is not None:
+        filters['min_votes'] = min_votes
+    return filters
+
+
+def parse_int(params, name, minimum, maximum):
+    try:
+        value = int(params[name])
+    except (KeyError, ValueError):
+        return None
+    return value if minimum <= value <= maximum else None
+
+
+def score_band_q(key):
+    for band, low, high in SCORE_BANDS:
+        if band == key:
+            return Q(score__gte=low) if high is None else Q(score__gte=low, score__lt=high)
+
+
+def filter_queryset(queryset, filters, exclude=None):
+    """
+    Apply the filters to the queryset, leaving out the one named by exclude.
+    """
+    if 'year' in filters and exclude != 'year':
+        queryset = queryset.filter(release_date__year=filters['year'])
+    if 'score' in filters and exclude != 'score':
+        queryset = queryset.filter(score_band_q(filters['score']))
+    if 'min_votes' in filters and exclude != 'min_votes':
+        queryset = queryset.filter(vote_count__gte=filters['min_votes'])
+    return queryset
+
+
+def compute_facets(queryset, filters):
+    years = (filter_queryset(queryset, filters, exclude='year')
+             .annotate(year=ExtractYear('release_date'))
+             .values('year').annotate(count=Count('id')).order_by('-year'))
+    scores = filter_queryset(queryset, filters, exclude='score').aggregate(**{
+        band: Count('id', filter=score_band_q(band)) for band, _, _ in SCORE_BANDS
+    })
+    votes = filter_queryset(queryset, filters, exclude='min_votes').aggregate(**{
+        str(threshold): Count('id', filter=Q(vote_count__gte=threshold)) for threshold in VOTE_THRESHOLDS
+    })
+    return {
+        'year': [(row['year'], row['count']) for row in years],
+        'score': [(band, scores[band]) for band, _, _ in SCORE_BANDS],
+        'min_votes': [(threshold, votes[str(threshold)]) for threshold in VOTE_THRESHOLDS],
+    }
+
+
+def facet_counts(queryset, filters):
+    """
+    Return the {facet: [(value, count), ...]} counts of the queryset, cached
+    per filter combination until invalidate() is called.
+    """
+    version = cache.get_or_set(VERSION_KEY, uuid.uuid4().hex, None)
+    key = 'polls:facets:%s:%s' % (version, ':'.join('%s=%s' % item for item in sorted(filters.items())))
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset, filters)
+        cache.set(key, facets, getattr(settings, 'POLLS_FACETS_CACHE_TIMEOUT', 60))
+    return facets
+
+
+def facet_options(facets, filters, params):
+    """
+    Return the facets as {facet: [option, ...]} where each option is a dict
+    with the value, count, whether it is selected and the query string that
+    toggles it.
+    """
+    options = {}
+    for name, values in facets.items():
+        options[name] = []
+        for value, count in values:
+            query = params.copy()
+            query.pop(name, None)
+            selected = filters.get(name) == value
+            if not selected:
+                query[name] = value
+            options[name].append({
+                'value': value,
+                'count': count,
+                'selected': selected,
+                'query': query.urlencode(),
+            })
+    return options
+
+
+def invalidate():
+    """
+    Drop every cached facet count by moving to a new cache version.
+    """
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
@@ -0,0 +1,143 @@
+"""
+Live results pushed to the results page as server-sent events.
+
+A single poller per process reads the vote histograms of every movie that
+is being watched, in one query per tick, and fans the changes out to the
+subscribers of each movie. However many people watch, the database is read
+once per tick.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .models import Choice
+
+QUEUE_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+def recycle_connections():
+    """
+    close_old_connections() for the poller, which runs outside any request:
+    drop broken connections and those older than CONN_MAX_AGE. Connections in
+    a transaction (only ever the case in tests) are left alone.
+    """
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+
+def read_histograms(movie_ids):
+    """
+    Return {movie_id: {'choices': {choice: votes}, 'score': ..., 'vote_count': ...}}
+    for the given movies.
+    """
+    recycle_connections()
+    try:
+        histograms = {}
+        rows = Choice.objects.filter(movie_id__in=movie_ids).values_list(
+            'movie_id', 'choice', 'votes', 'movie__score', 'movie__vote_count')
+        for movie_id, choice, votes, score, vote_count in rows:
+            histogram = histograms.setdefault(movie_id, {'choices': {}, 'score': score, 'vote_count': vote_count})
+            histogram['choices'][choice] = votes
+        return histograms
+    finally:
+        recycle_connections()
+
+
+def delta(old, new):
+    """
+    Return the parts of the new histogram that differ from the old one, or
+    None when nothing changed.
+    """
+    if old is None:
+        return new
+    changes = {'choices': {choice: votes for choice, votes in new['choices'].items()
+                           if old['choices'].get(choice) != votes}}
+    for field in ('score', 'vote_count'):
+        if old[field] != new[field]:
+            changes[field] = new[field]
+    if changes['choices'] or len(changes) > 1:
+        return changes
+
+
+class ResultsBroadcaster:
+    def __init__(self):
+        self.reset()
+
+    def reset(self, loop=None):
+        self.subscribers = defaultdict(set)
+        self.histograms = {}
+        self.task = None
+        self.loop = loop
+
+    @property
+    def interval(self):
+        return getattr(settings, 'POLLS_LIVE_RESULTS_INTERVAL', 1)
+
+    def subscribe(self, movie_id):
+        """
+        Return a queue receiving the changes to the results of a movie. The
+        first item is the full histogram, when it is already known.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            # Queues and the poller belong to the event loop they were made in.
+            self.reset(loop)
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self.subscribers[movie_id].add(queue)
+        if movie_id in self.histograms:
+            queue.put_nowait(self.histograms[movie_id])
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, movie_id, queue):
+        queues = self.subscribers.get(movie_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[movie_id]
+                self.histograms.pop(movie_id, None)
+
+    async def run(self):
+        while self.subscribers:
+            try:
+                await self.tick()
+            except Exception:
+                # Keep polling for the current subscribers; the next tick may work.
+                logger.exception('Reading the live results failed')
+            await asyncio.sleep(self.interval)
+
+    async def tick(self):
+        """
+        Read the histograms of every watched movie and send the changes.
+        """
+        movie_ids = list(self.subscribers)
+        if not movie_ids:
+            return
+        histograms = await sync_to_async(read_histograms)(movie_ids)
+        for movie_id in movie_ids:
+            new = histograms.get(movie_id)
+            if new is None or movie_id not in self.subscribers:
+                continue
+            changes = delta(self.histograms.get(movie_id), new)
+            self.histograms[movie_id] = new
+            if changes is None:
+                continue
+            for queue in self.subscribers[movie_id]:
+                try:
+                    queue.put_nowait(changes)
+                except asyncio.QueueFull:
+                    # A slow client gets the whole histogram instead of the backlog.
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(new)
+
+
+broadcaster = ResultsBroadcaster()
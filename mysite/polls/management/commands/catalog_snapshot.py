@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.catalog import Catalog, prune_changes
+
+
+class Command(BaseCommand):
+    help = 'Writes the movie catalog snapshot loaded by the web workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=getattr(settings, 'POLLS_CATALOG_SNAPSHOT', None),
+                            help='Snapshot file, POLLS_CATALOG_SNAPSHOT by default.')
+
+    def handle(self, *args, **options):
+        if not options['path']:
+            raise CommandError('No snapshot path given and POLLS_CATALOG_SNAPSHOT is not set.')
+        catalog = Catalog.from_db()
+        catalog.save_snapshot(options['path'])
+        pruned = prune_changes()
+        self.stdout.write(self.style.SUCCESS('Wrote %d movies at version %d to %s (pruned %d changes).' % (
+            len(catalog.order), catalog.version, options['path'], pruned)))
@@ -0,0 +1,52 @@
+import io
+import json
+import os
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Summarizes the request profiles saved by ProfilingMiddleware, slowest views first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=getattr(settings, 'POLLS_PROFILE_DIR', settings.BASE_DIR / 'profiles'),
+                            help='Profile directory, POLLS_PROFILE_DIR by default.')
+        parser.add_argument('--top', type=int, default=10, help='Number of views to show.')
+        parser.add_argument('--functions', type=int, default=0,
+                            help='Also print this many functions of the slowest profile of every view.')
+
+    def handle(self, *args, **options):
+        directory = options['dir']
+        views = {}
+        if os.path.isdir(directory):
+            for entry in os.scandir(directory):
+                if entry.name.endswith('.json'):
+                    with open(entry.path) as summary:
+                        profile = json.load(summary)
+                    profile['name'] = entry.name[:-len('.json')]
+                    views.setdefault(profile['view'], []).append(profile)
+        if not views:
+            self.stdout.write('No profiles found in %s.' % directory)
+            return
+
+        worst = sorted(views.items(), key=lambda item: max(profile['ms'] for profile in item[1]), reverse=True)
+        self.stdout.write('%-30s %6s %10s %10s %8s  %s' % ('view', 'count', 'max ms', 'avg ms', 'queries', 'slowest'))
+        for view, profiles in worst[:options['top']]:
+            slowest = max(profiles, key=lambda profile: profile['ms'])
+            self.stdout.write('%-30s %6d %10.1f %10.1f %8d  %s' % (
+                view, len(profiles), slowest['ms'], sum(profile['ms'] for profile in profiles) / len(profiles),
+                slowest['query_count'], slowest['name']))
+            if options['functions']:
+                self.print_functions(directory, slowest, options['functions'])
+
+    def print_functions(self, directory, profile, count):
+        output = io.StringIO()
+        stats = pstats.Stats(os.path.join(directory, profile['name'] + '.prof'), stream=output)
+        stats.sort_stats('cumulative').print_stats(count)
+        self.stdout.write(output.getvalue())
+        for query in sorted(profile['queries'], key=lambda query: query['ms'], reverse=True)[:count]:
+            self.stdout.write('  %8.2f ms  %s' % (query['ms'], query['sql'][:120]))
+            for frame in query['origin'][-3:]:
+                self.stdout.write('               %s' % frame)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from polls import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Computes the "similar movies" recommendations from the movie overviews.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute every movie instead of only the ones added since the last run.')
+        parser.add_argument('-k', type=int, default=recommendations.TOP_K,
+                            help='Number of neighbours stored per movie.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = recommendations.rebuild(k=options['k'])
+            self.stdout.write(self.style.SUCCESS('Stored %d similar movie links.' % count))
+        else:
+            count = recommendations.refresh(k=options['k'])
+            self.stdout.write(self.style.SUCCESS('Refreshed %d movies.' % count))
@@ -0,0 +1,305 @@
+import cProfile
+import hmac
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+import traceback
+from contextlib import ExitStack, contextmanager
+from gzip import GzipFile
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import StreamingBuffer, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_CONTENT_TYPES = (
+    'text/html',
+    'text/css',
+    'text/plain',
+    'application/javascript',
+    'application/json',
+)
+# Like GZipMiddleware, pad gzip headers with up to this many random bytes so
+# that the length of a page does not reveal how well its secrets (the CSRF
+# token) compress against guesses echoed from the request (BREACH).
+MAX_RANDOM_BYTES = 100
+# Pages carrying CSRF tokens and forms. brotli has no header to pad, so they
+# are only ever sent gzipped.
+BREACH_SENSITIVE_TYPES = ('text/html',)
+ACCEPT_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?')
+
+
+def accepted_encodings(header):
+    """
+    Return the encodings of an Accept-Encoding header that are not refused
+    with q=0.
+    """
+    encodings = set()
+    for part in header.split(','):
+        match = ACCEPT_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2) or 1)
+        except ValueError:
+            # A malformed q-value, such as "q=1.2.3".
+            continue
+        if quality > 0:
+            encodings.add(match.group(1).lower())
+    return encodings
+
+
+class GzipEncoder:
+    name = 'gzip'
+    padded = True
+
+    def __init__(self, max_random_bytes):
+        self.max_random_bytes = max_random_bytes
+
+    def compress(self, data):
+        return compress_string(data, max_random_bytes=self.max_random_bytes)
+
+    def compress_sequence(self, chunks):
+        # django.utils.text.compress_sequence() with the same random padding,
+        # but flushing every chunk so streamed pages reach the client as they
+        # render.
+        buffer = StreamingBuffer()
+        filename = b'a' * secrets.randbelow(self.max_random_bytes)
+        with GzipFile(filename=filename, mode='wb', compresslevel=6, fileobj=buffer, mtime=0) as compressed:
+            for chunk in chunks:
+                compressed.write(chunk)
+                compressed.flush()
+                data = buffer.read()
+                if data:
+                    yield data
+        yield buffer.read()
+
+
+class BrotliEncoder:
+    name = 'br'
+    padded = False
+
+    def __init__(self, quality):
+        self.quality = quality
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.quality)
+
+    def compress_sequence(self, chunks):
+        compressor = brotli.Compressor(quality=self.quality)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with brotli (when the brotli package is installed) or
+    gzip, depending on what the client accepts.
+
+    Only responses whose content type is listed in COMPRESSION_CONTENT_TYPES
+    and whose body is at least COMPRESSION_MIN_SIZE bytes are compressed.
+    Streaming responses are compressed chunk by chunk. HTML is only gzipped,
+    with the BREACH length padding of Django's GZipMiddleware.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+        self.content_types = tuple(getattr(settings, 'COMPRESSION_CONTENT_TYPES', DEFAULT_CONTENT_TYPES))
+        self.encoders = [GzipEncoder(MAX_RANDOM_BYTES)]
+        if brotli is not None:
+            self.encoders.insert(0, BrotliEncoder(getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)))
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code < 200 or response.status_code == 204:
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in self.content_types:
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoder = next((encoder for encoder in self.encoders if encoder.name in accepted
+                        and (encoder.padded or content_type not in BREACH_SENSITIVE_TYPES)), None)
+        if encoder is None:
+            return response
+
+        if response.streaming:
+            if getattr(response, 'is_async', False):
+                return response
+            response.streaming_content = encoder.compress_sequence(response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = encoder.compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The ETag of the uncompressed body no longer matches byte for byte.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoder.name
+        return response
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper recording the SQL, duration and the project
+    code that issued every query.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+        self.base_dir = str(settings.BASE_DIR)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries.append({
+                'database': self.alias,
+                'sql': sql,
+                'ms': round(duration * 1000, 3),
+                'origin': self.origin(),
+            })
+
+    def origin(self):
+        return ['%s:%d %s' % (os.path.relpath(frame.filename, self.base_dir), frame.lineno, frame.name)
+                for frame in traceback.extract_stack()[:-2]
+                if frame.filename.startswith(self.base_dir) and frame.filename != __file__]
+
+
+_profile_lock = threading.Lock()
+
+
+class ProfilingMiddleware:
+    """
+    Run selected requests under cProfile and save the profile, together with
+    the SQL they issued, to POLLS_PROFILE_DIR.
+
+    A request is profiled when it carries an X-Profile-Token header equal to
+    POLLS_PROFILE_TOKEN, or at random with probability
+    POLLS_PROFILE_SAMPLE_RATE. Only the POLLS_PROFILE_KEEP most recent
+    profiles are kept. Summarize them with the profile_summary command.
+
+    Under ASGI a profiled request is run from a worker thread, which is also
+    the thread its sync views and their database connections run in. Only one
+    request is profiled at a time; others arriving meanwhile are served as
+    usual.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.token = getattr(settings, 'POLLS_PROFILE_TOKEN', None)
+        self.sample_rate = getattr(settings, 'POLLS_PROFILE_SAMPLE_RATE', 0)
+        self.directory = getattr(settings, 'POLLS_PROFILE_DIR', settings.BASE_DIR / 'profiles')
+        self.keep = getattr(settings, 'POLLS_PROFILE_KEEP', 200)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.triggered(request):
+            return self.get_response(request)
+        return self.profiled(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not self.triggered(request):
+            return await self.get_response(request)
+        return await sync_to_async(self.profiled)(request, async_to_sync(self.get_response))
+
+    def profiled(self, request, get_response):
+        # cProfile and the execute wrappers only see the thread they are set
+        # up in, and two profilers cannot run at once.
+        if not _profile_lock.acquire(blocking=False):
+            return get_response(request)
+        try:
+            with self.profile(request) as result:
+                result['response'] = get_response(request)
+        finally:
+            _profile_lock.release()
+        return result['response']
+
+    def triggered(self, request):
+        if self.token:
+            header = request.META.get('HTTP_X_PROFILE_TOKEN')
+            if header is not None and hmac.compare_digest(header.encode(), self.token.encode()):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, request):
+        """
+        Profile the body of the with block, which must store the response in
+        the yielded dict, then save the profile and label the response.
+        """
+        recorders = [QueryRecorder(connection.alias) for connection in connections.all()]
+        profiler = cProfile.Profile()
+        result = {}
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection, recorder in zip(connections.all(), recorders):
+                stack.enter_context(connection.execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                yield result
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+        response = result['response']
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        now = time.time()
+        name = '%s-%06d-%s-%dms' % (time.strftime('%Y%m%d-%H%M%S', time.gmtime(now)), now % 1 * 1000000,
+                                    re.sub(r'[^\w.-]', '_', view), duration * 1000)
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, name + '.prof'))
+        queries = [query for recorder in recorders for query in recorder.queries]
+        with open(os.path.join(self.directory, name + '.json'), 'w') as summary:
+            json.dump({
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'ms': round(duration * 1000, 3),
+                'query_count': len(queries),
+                'query_ms': round(sum(query['ms'] for query in queries), 3),
+                'queries': queries,
+            }, summary, indent=2)
+        self.rotate()
+        response['X-Profile-Id'] = name
+
+    def rotate(self):
+        summaries = sorted(entry.path for entry in os.scandir(self.directory) if entry.name.endswith('.json'))
+        for path in summaries[:max(0, len(summaries) - self.keep)]:
+            for stale in (path, path[:-len('.json')] + '.prof'):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_alter_choice_choice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarMovie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='polls.movie')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='polls.movie')),
+            ],
+            options={
+                'ordering': ['-similarity'],
+                'indexes': [models.Index(fields=['movie', '-similarity'], name='polls_simil_movie_i_a80aed_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0006_similarmovie'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['release_date'], name='polls_movie_release_f81b7c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['score'], name='polls_movie_score_c1202c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['vote_count'], name='polls_movie_vote_co_62c79e_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0007_movie_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movie_id', models.BigIntegerField()),
+                ('changed', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -13,6 +13,13 @@ class Movie(models.Model):
     vote_count = models.IntegerField()
     overview = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['release_date']),
+            models.Index(fields=['score']),
+            models.Index(fields=['vote_count']),
+        ]
+
     def was_published_recently(self):
         now = timezone.now()
         return now - datetime.timedelta(days=1) <= self.release_date <= now
@@ -28,3 +35,30 @@ class Choice(models.Model):
 
     def __str__(self):
         return str(self.choice)
+
+
+class SimilarMovie(models.Model):
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='similar_links')
+    similar = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    similarity = models.FloatField()
+
+    class Meta:
+        ordering = ['-similarity']
+        indexes = [
+            models.Index(fields=['movie', '-similarity']),
+        ]
+
+    def __str__(self):
+        return '%s -> %s' % (self.movie_id, self.similar_id)
+
+
+class CatalogChange(models.Model):
+    """
+    Change marker read by the in-process catalog (see polls.catalog): every
+    row records that a movie was added, changed or deleted.
+    """
+    movie_id = models.BigIntegerField()
+    changed = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return '%s: movie %s' % (self.id, self.movie_id)
@@ -0,0 +1,178 @@
+"""
+"Similar movies" recommendations built from the movie overviews.
+
+Every overview is turned into a sparse, L2-normalised TF-IDF vector (a dict of
+term -> weight) and the nearest neighbours of each movie are found through an
+inverted index, so only movies sharing at least one term are ever compared.
+The top neighbours are stored in the SimilarMovie table and looked up with a
+single indexed query when a page is rendered.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Movie, SimilarMovie
+
+TOP_K = 10
+# Terms found in more than this share of overviews, or in more than
+# MAX_POSTING_LENGTH of them, carry little signal and are dropped. This keeps
+# every posting list short, so finding the neighbours of one movie costs about
+# the same whatever the size of the catalog. Small catalogs keep every term
+# found in up to MIN_POSTING_LENGTH overviews, as a share of a few dozen
+# overviews says little about a term.
+MAX_DOCUMENT_FREQUENCY = 0.05
+MIN_POSTING_LENGTH = 50
+MAX_POSTING_LENGTH = 1000
+# Only the heaviest terms of a movie are used to look up candidates.
+QUERY_TERMS = 25
+BATCH_SIZE = 1000
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from has have he her his in into is it
+    its of on or she that the their them they this to was were when which who
+    will with after before while about all also up out over him one two
+""".split())
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower())
+            if len(token) > 2 and token not in STOP_WORDS]
+
+
+def build_vectors(overviews):
+    """
+    Return a {movie_id: {term: weight}} dict of normalised TF-IDF vectors for
+    the given {movie_id: overview} dict.
+    """
+    term_counts = {movie_id: Counter(tokenize(text or '')) for movie_id, text in overviews.items()}
+    document_frequency = Counter()
+    for counts in term_counts.values():
+        document_frequency.update(counts.keys())
+
+    total = len(term_counts)
+    max_df = max(MIN_POSTING_LENGTH, min(int(total * MAX_DOCUMENT_FREQUENCY), MAX_POSTING_LENGTH))
+    idf = {term: math.log((1 + total) / (1 + df)) + 1
+           for term, df in document_frequency.items() if df <= max_df}
+
+    vectors = {}
+    for movie_id, counts in term_counts.items():
+        weights = {term: (1 + math.log(count)) * idf[term]
+                   for term, count in counts.items() if term in idf}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        vectors[movie_id] = {term: weight / norm for term, weight in weights.items()} if norm else {}
+    return vectors
+
+
+def build_index(vectors):
+    """
+    Return the inverted index {term: [(movie_id, weight), ...]} of the vectors.
+    """
+    index = defaultdict(list)
+    for movie_id, vector in vectors.items():
+        for term, weight in vector.items():
+            index[term].append((movie_id, weight))
+    return index
+
+
+def nearest(movie_id, vectors, index, k=TOP_K):
+    """
+    Return the k (similarity, movie_id) pairs closest to the given movie.
+    """
+    vector = vectors.get(movie_id)
+    if not vector:
+        return []
+    scores = defaultdict(float)
+    terms = heapq.nlargest(QUERY_TERMS, vector.items(), key=lambda item: item[1])
+    for term, weight in terms:
+        for other_id, other_weight in index[term]:
+            scores[other_id] += weight * other_weight
+    scores.pop(movie_id, None)
+    return heapq.nlargest(k, ((score, other_id) for other_id, score in scores.items()))
+
+
+def load_vectors():
+    overviews = dict(Movie.objects.values_list('id', 'overview').iterator(chunk_size=BATCH_SIZE))
+    return build_vectors(overviews)
+
+
+def rebuild(k=TOP_K):
+    """
+    Recompute the neighbours of every movie. Returns the number of links stored.
+    """
+    vectors = load_vectors()
+    index = build_index(vectors)
+    movie_ids = [movie_id for movie_id, vector in vectors.items() if vector]
+    count = 0
+    with transaction.atomic():
+        SimilarMovie.objects.all().delete()
+        for start in range(0, len(movie_ids), BATCH_SIZE):
+            links = [SimilarMovie(movie_id=movie_id, similar_id=other_id, similarity=score)
+                     for movie_id in movie_ids[start:start + BATCH_SIZE]
+                     for score, other_id in nearest(movie_id, vectors, index, k)]
+            SimilarMovie.objects.bulk_create(links)
+            count += len(links)
+    return count
+
+
+def refresh(movie_ids=None, k=TOP_K):
+    """
+    Compute the neighbours of newly added movies (by default every movie that
+    has no neighbours yet and whose overview has any usable term) and insert
+    them into the neighbour lists of existing movies when they rank in their
+    top k. Only these movies are scored against the index; the other overviews
+    are read for the document frequencies. Returns the number of movies refreshed.
+    """
+    vectors = load_vectors()
+    if movie_ids is None:
+        linked = set(SimilarMovie.objects.values_list('movie_id', flat=True).distinct())
+        movie_ids = {movie_id for movie_id, vector in vectors.items() if vector and movie_id not in linked}
+    movie_ids = {movie_id for movie_id in movie_ids if vectors.get(movie_id)}
+    if not movie_ids:
+        return 0
+
+    index = build_index(vectors)
+    new_links = {movie_id: nearest(movie_id, vectors, index, k) for movie_id in movie_ids}
+
+    # Best new candidates for the neighbour lists of the existing movies.
+    incoming = defaultdict(list)
+    for movie_id, neighbours in new_links.items():
+        for score, other_id in neighbours:
+            if other_id not in movie_ids:
+                incoming[other_id].append((score, movie_id))
+
+    with transaction.atomic():
+        # Links from and to the refreshed movies are all recomputed.
+        SimilarMovie.objects.filter(movie_id__in=movie_ids).delete()
+        SimilarMovie.objects.filter(similar_id__in=movie_ids).delete()
+        existing = defaultdict(list)
+        for link in SimilarMovie.objects.filter(movie_id__in=incoming.keys()):
+            existing[link.movie_id].append(link)
+        links = [SimilarMovie(movie_id=movie_id, similar_id=other_id, similarity=score)
+                 for movie_id, neighbours in new_links.items()
+                 for score, other_id in neighbours]
+        stale = []
+        for other_id, candidates in incoming.items():
+            current = [(link.similarity, link.similar_id, link) for link in existing[other_id]]
+            merged = heapq.nlargest(k, current + [(score, movie_id, None) for score, movie_id in candidates],
+                                    key=lambda item: item[0])
+            kept = {id(item[2]) for item in merged if item[2] is not None}
+            stale.extend(link.id for _, _, link in current if id(link) not in kept)
+            links.extend(SimilarMovie(movie_id=other_id, similar_id=movie_id, similarity=score)
+                         for score, movie_id, link in merged if link is None)
+        SimilarMovie.objects.filter(id__in=stale).delete()
+        SimilarMovie.objects.bulk_create(links, batch_size=BATCH_SIZE)
+    return len(new_links)
+
+
+def similar_movies(movie, k=TOP_K):
+    """
+    Return the stored, published neighbours of a movie, most similar first.
+    """
+    return [link.similar for link in
+            SimilarMovie.objects.filter(movie=movie, similar__release_date__lte=timezone.now())
+            .select_related('similar')[:k]]
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog, facets
+from .models import Movie
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def movie_changed(sender, instance, **kwargs):
+    facets.invalidate()
+    catalog.mark_changed([instance.id])
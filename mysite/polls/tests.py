@@ -1,9 +1,24 @@
 from django.core.exceptions import ValidationError
 import datetime
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import pstats
+import tempfile
+from unittest import mock, skipIf
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 from django.utils import timezone
 from django.urls import reverse
-from .models import Movie, Choice
+from .middleware import CompressionMiddleware, brotli
+from .models import Movie, Choice, CatalogChange, SimilarMovie
+from . import catalog, facets, live, recommendations, warmup
+from .live import ResultsBroadcaster
 
 
 class TestModels(TestCase):
@@ -242,3 +257,655 @@ class VoteViewTest(TestCase):
         self.assertRedirects(response, reverse('polls:index'))
 
 
+class SimilarMoviesTest(TestCase):
+    def create_movie(self, title, overview):
+        return Movie.objects.create(title=title, release_date=timezone.now(), image="some path",
+                                    score=0, vote_count=0, overview=overview)
+
+    def setUp(self):
+        self.space = self.create_movie("Space", "astronauts travel through a wormhole to save humanity")
+        self.space2 = self.create_movie("Space 2", "a crew of astronauts lost near a wormhole")
+        self.crime = self.create_movie("Crime", "a gangster boss rules the city underworld")
+
+    def test_rebuild(self):
+        """
+        rebuild() links movies whose overviews share terms, most similar first.
+        """
+        recommendations.rebuild()
+        self.assertEqual(recommendations.similar_movies(self.space), [self.space2])
+        self.assertEqual(recommendations.similar_movies(self.crime), [])
+
+    def test_refresh_new_movie(self):
+        """
+        refresh() computes new movies and adds them to existing neighbour lists.
+        """
+        recommendations.rebuild()
+        crime2 = self.create_movie("Crime 2", "the gangster boss returns to the underworld")
+        recommendations.refresh()
+        self.assertEqual(recommendations.similar_movies(crime2), [self.crime])
+        self.assertEqual(recommendations.similar_movies(self.crime), [crime2])
+
+    def test_refresh_keeps_top_k(self):
+        """
+        refresh() never stores more than k neighbours per movie.
+        """
+        recommendations.rebuild(k=1)
+        space3 = self.create_movie("Space 3", "astronauts travel through a wormhole to save humanity")
+        recommendations.refresh(k=1)
+        self.assertEqual(recommendations.similar_movies(self.space), [space3])
+        self.assertEqual(SimilarMovie.objects.filter(movie=self.space).count(), 1)
+
+    def test_small_catalog_keeps_shared_terms(self):
+        """
+        In a small catalog, terms shared by a few overviews still link them.
+        """
+        for i in range(20):
+            self.create_movie("Other %d" % i, "story number%d" % i)
+        galaxy = [self.create_movie("Galaxy %d" % i, "astronauts wormhole galaxy") for i in range(3)]
+        recommendations.rebuild()
+        self.assertEqual(set(recommendations.similar_movies(galaxy[0])[:2]), set(galaxy[1:]))
+
+    def test_unreleased_movies_not_recommended(self):
+        """
+        Movies that are not released yet are not listed as similar.
+        """
+        self.space2.release_date = timezone.now() + datetime.timedelta(days=30)
+        self.space2.save()
+        recommendations.rebuild()
+        self.assertEqual(recommendations.similar_movies(self.space), [])
+        response = self.client.get(reverse('polls:similar', args=(self.space.id,)))
+        self.assertEqual(response.json()['similar'], [])
+
+    def test_refresh_existing_movie_no_duplicates(self):
+        """
+        Refreshing a movie that already has links does not list it twice.
+        """
+        recommendations.rebuild()
+        recommendations.refresh([self.space2.id])
+        self.assertEqual(recommendations.similar_movies(self.space), [self.space2])
+
+    def test_refresh_skips_empty_overviews(self):
+        """
+        Movies without any usable term are not refreshed again and again.
+        """
+        self.crime.delete()
+        recommendations.rebuild()
+        self.create_movie("Empty", "the and of")
+        self.assertEqual(recommendations.refresh(), 0)
+
+    def test_similar_endpoint(self):
+        """
+        The similar endpoint returns the neighbours as JSON.
+        """
+        recommendations.rebuild()
+        response = self.client.get(reverse('polls:similar', args=(self.space.id,)))
+        self.assertEqual(response.json()['similar'][0]['id'], self.space2.id)
+
+    def test_detail_shows_similar_movies(self):
+        """
+        The detail page lists the similar movies.
+        """
+        recommendations.rebuild()
+        response = self.client.get(reverse('polls:detail', args=(self.space.id,)))
+        self.assertContains(response, "Similar movies")
+        self.assertContains(response, "Space 2")
+
+
+class CompressionMiddlewareTest(TestCase):
+    def process(self, response, accept_encoding='gzip'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response).process_response(request, response)
+
+    def test_compresses_large_html(self):
+        """
+        Large HTML responses are gzipped when the client accepts gzip.
+        """
+        body = b"<li>movie</li>" * 500
+        response = self.process(HttpResponse(body))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), body)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_small_response_not_compressed(self):
+        """
+        Responses below the size threshold are sent as they are.
+        """
+        response = self.process(HttpResponse(b"<p>small</p>"))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_other_content_type_not_compressed(self):
+        """
+        Content types outside the configured list are sent as they are.
+        """
+        response = self.process(HttpResponse(b"x" * 5000, content_type='image/png'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_client_without_gzip(self):
+        """
+        Nothing is compressed when the client does not accept gzip.
+        """
+        response = self.process(HttpResponse(b"<li>movie</li>" * 500), accept_encoding='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_malformed_quality(self):
+        """
+        Encodings with a malformed q-value are ignored instead of failing.
+        """
+        response = self.process(HttpResponse(b"<li>movie</li>" * 500), accept_encoding='gzip;q=1.2.3, br;q=.')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_random_length(self):
+        """
+        The compressed length of the same page varies, as a BREACH mitigation.
+        """
+        body = b"<li>movie</li>" * 500
+        lengths = {len(self.process(HttpResponse(body)).content) for _ in range(10)}
+        self.assertGreater(len(lengths), 1)
+
+    @skipIf(brotli is None, 'brotli is not installed')
+    def test_html_not_brotli(self):
+        """
+        HTML is gzipped even for clients preferring brotli, other types are not.
+        """
+        body = b"<li>movie</li>" * 500
+        self.assertEqual(self.process(HttpResponse(body), 'br, gzip')['Content-Encoding'], 'gzip')
+        response = self.process(HttpResponse(body, content_type='application/json'), 'br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+    def test_streaming_response(self):
+        """
+        Streaming responses are compressed chunk by chunk.
+        """
+        chunks = [b"<li>movie</li>" * 100] * 5
+        response = self.process(StreamingHttpResponse(iter(chunks)))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), b"".join(chunks))
+
+
+class StreamedIndexTest(TestCase):
+    @override_settings(POLLS_STREAM_THRESHOLD=2)
+    def test_long_listing_is_streamed(self):
+        """
+        Listings above the stream threshold are streamed with every movie.
+        """
+        for i in range(5):
+            Movie.objects.create(title="Movie %d" % i, release_date=timezone.now() - datetime.timedelta(days=i),
+                                 image="some path", score=0, vote_count=0, overview="some overview")
+        response = self.client.get(reverse('polls:index'))
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        self.assertIn("Movies Listing", content)
+        for i in range(5):
+            self.assertIn("Movie %d" % i, content)
+        self.assertTrue(content.rstrip().endswith("</html>"))
+
+    def test_short_listing_is_not_streamed(self):
+        """
+        Listings below the stream threshold are rendered in one piece.
+        """
+        Movie.objects.create(title="Movie", release_date=timezone.now(),
+                             image="some path", score=0, vote_count=0, overview="some overview")
+        response = self.client.get(reverse('polls:index'))
+        self.assertFalse(response.streaming)
+        self.assertContains(response, "Movie")
+
+
+class FacetedIndexTest(TestCase):
+    def create_movie(self, title, year, score, vote_count):
+        return Movie.objects.create(title=title, release_date=datetime.datetime(year, 6, 1, tzinfo=datetime.timezone.utc),
+                                    image="some path", score=score, vote_count=vote_count, overview="some overview")
+
+    def setUp(self):
+        cache.clear()
+        self.create_movie("Old good", 1999, 8.5, 5000)
+        self.create_movie("Old bad", 1999, 3.0, 50)
+        self.create_movie("New good", 2020, 9.0, 200)
+
+    def test_filter_by_year(self):
+        """
+        The year filter keeps only the movies released that year.
+        """
+        response = self.client.get(reverse('polls:index'), {'year': 1999})
+        self.assertEqual({movie.title for movie in response.context['latest_movie_list']}, {"Old good", "Old bad"})
+
+    def test_filter_combination(self):
+        """
+        Filters combine, and invalid values are ignored.
+        """
+        response = self.client.get(reverse('polls:index'), {'score': '8-10', 'min_votes': 1000, 'year': 'x'})
+        self.assertEqual([movie.title for movie in response.context['latest_movie_list']], ["Old good"])
+
+    def test_out_of_range_filters_ignored(self):
+        """
+        Years and vote counts the database cannot handle are ignored.
+        """
+        for params in ({'year': 100000}, {'year': -3}, {'year': 0}, {'min_votes': '9' * 25}, {'min_votes': -1}):
+            self.assertEqual(facets.parse_filters(params), {})
+            response = self.client.get(reverse('polls:index'), params)
+            self.assertEqual(len(response.context['latest_movie_list']), 3)
+            self.assertEqual(self.client.get(reverse('polls:movie_list'), params).status_code, 200)
+
+    def test_facet_counts(self):
+        """
+        Each facet counts the movies left by the other active filters.
+        """
+        response = self.client.get(reverse('polls:index'), {'score': '8-10'})
+        counts = {name: {option['value']: option['count'] for option in options}
+                  for name, options in response.context['facets'].items()}
+        self.assertEqual(counts['year'], {2020: 1, 1999: 1})
+        self.assertEqual(counts['score']['8-10'], 2)
+        self.assertEqual(counts['score']['2-4'], 1)
+        self.assertEqual(counts['min_votes'][100], 2)
+
+    def test_facet_counts_are_cached(self):
+        """
+        Facet counts are computed with one query per facet and then cached.
+        """
+        published = Movie.objects.all()
+        with self.assertNumQueries(3):
+            facets.facet_counts(published, {})
+        with self.assertNumQueries(0):
+            facets.facet_counts(published, {})
+
+    def test_facet_cache_invalidated_on_change(self):
+        """
+        Adding a movie invalidates the cached counts.
+        """
+        self.assertEqual(dict(facets.facet_counts(Movie.objects.all(), {})['year'])[2020], 1)
+        self.create_movie("Another new", 2020, 5.0, 10)
+        self.assertEqual(dict(facets.facet_counts(Movie.objects.all(), {})['year'])[2020], 2)
+
+
+@override_settings(POLLS_CATALOG=True, POLLS_CATALOG_SNAPSHOT=None, POLLS_CATALOG_REFRESH_INTERVAL=0)
+class CatalogTest(TestCase):
+    def create_movie(self, title, days_ago=1, score=5.0):
+        return Movie.objects.create(title=title, release_date=timezone.now() - datetime.timedelta(days=days_ago),
+                                    image="some path", score=score, vote_count=10, overview="some overview")
+
+    def setUp(self):
+        catalog.reset()
+        cache.clear()
+        self.old = self.create_movie("Old movie", days_ago=10)
+        self.new = self.create_movie("New movie", days_ago=1)
+        self.create_movie("Future movie", days_ago=-30)
+
+    def tearDown(self):
+        catalog.reset()
+
+    def test_movies_newest_first(self):
+        """
+        The catalog lists the published movies newest first as records.
+        """
+        movies = catalog.get_catalog().movies()
+        self.assertEqual([movie.title for movie in movies], ["New movie", "Old movie"])
+        self.assertEqual(movies[0].id, self.new.id)
+
+    def test_refresh_applies_changes(self):
+        """
+        Saved and deleted movies are picked up from the change markers.
+        """
+        catalog.get_catalog()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.old.title = "Renamed movie"
+            self.old.save()
+            self.new.delete()
+            self.create_movie("Added movie", days_ago=2)
+        movies = catalog.get_catalog().movies()
+        self.assertEqual([movie.title for movie in movies], ["Added movie", "Renamed movie"])
+
+    def test_vote_marks_change(self):
+        """
+        Voting updates the score served by the catalog.
+        """
+        choice = Choice.objects.create(movie=self.new, choice=9, votes=0)
+        catalog.get_catalog()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('polls:vote', args=(self.new.id,)), {'choice': choice.id})
+        self.assertEqual(catalog.get_catalog().get(self.new.id).score, 7.0)
+
+    def test_markers_wait_for_commit(self):
+        """
+        No change marker is written before the change commits.
+        """
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.create_movie("Added movie")
+        self.assertFalse(CatalogChange.objects.exists())
+        callbacks[0]()
+        self.assertEqual(CatalogChange.objects.get().movie_id, Movie.objects.get(title="Added movie").id)
+
+    def test_refresh_applies_late_markers(self):
+        """
+        A marker committed after a newer one is still applied.
+        """
+        first = CatalogChange.objects.create(movie_id=self.old.id)
+        CatalogChange.objects.create(movie_id=self.new.id)
+        first.delete()
+        loaded = catalog.Catalog.from_db()
+        Movie.objects.filter(pk=self.old.id).update(title="Renamed movie")
+        CatalogChange.objects.create(id=first.id, movie_id=self.old.id)
+        self.assertEqual(loaded.refresh(), 1)
+        self.assertEqual(loaded.get(self.old.id).title, "Renamed movie")
+        self.assertEqual(loaded.refresh(), 0)
+
+    def test_refresh_prunes_old_markers(self):
+        """
+        Refreshing deletes the markers older than the retention period.
+        """
+        loaded = catalog.Catalog.from_db()
+        old = CatalogChange.objects.create(movie_id=self.old.id)
+        CatalogChange.objects.filter(pk=old.pk).update(
+            changed=timezone.now() - catalog.CHANGE_RETENTION - datetime.timedelta(minutes=1))
+        recent = CatalogChange.objects.create(movie_id=self.new.id)
+        loaded.refresh()
+        self.assertEqual(list(CatalogChange.objects.all()), [recent])
+
+    def test_snapshot_round_trip(self):
+        """
+        A snapshot file loads back into the same catalog.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.bin')
+            catalog.Catalog.from_db().save_snapshot(path)
+            loaded = catalog.Catalog.from_snapshot(path)
+            self.assertEqual([(movie.id, movie.title, movie.score) for movie in loaded.movies()],
+                             [(movie.id, movie.title, movie.score) for movie in catalog.Catalog.from_db().movies()])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.create_movie("Added movie", days_ago=0)
+            loaded.refresh()
+            self.assertEqual(loaded.movies()[0].title, "Added movie")
+
+    def test_facet_counts_match_database(self):
+        """
+        The catalog facet counts match the ones computed by the database.
+        """
+        published = Movie.objects.filter(release_date__lte=timezone.now())
+        self.assertEqual(catalog.get_catalog().facet_counts({'score': '4-6'}),
+                         facets.compute_facets(published, {'score': '4-6'}))
+
+    @override_settings(POLLS_CATALOG_REFRESH_INTERVAL=60)
+    def test_index_without_queries(self):
+        """
+        With a loaded catalog, the index and the listing API run no queries.
+        """
+        catalog.get_catalog()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:index'))
+            self.assertContains(response, "New movie")
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:movie_list'), {'score': '4-6'})
+            self.assertEqual(len(response.json()['movies']), 2)
+
+
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def profiles(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_not_triggered(self):
+        """
+        Requests without the token are not profiled.
+        """
+        with self.settings(POLLS_PROFILE_TOKEN='secret', POLLS_PROFILE_DIR=self.directory):
+            response = self.client.get(reverse('polls:index'), HTTP_X_PROFILE_TOKEN='wrong')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(self.profiles(), [])
+
+    def test_non_ascii_token(self):
+        """
+        A token header with non-ASCII characters is simply not a match.
+        """
+        with self.settings(POLLS_PROFILE_TOKEN='secret', POLLS_PROFILE_DIR=self.directory):
+            response = self.client.get(reverse('polls:index'), HTTP_X_PROFILE_TOKEN='sécret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.profiles(), [])
+
+    async def test_async_profile(self):
+        """
+        Requests served by the async handler are profiled with their view and SQL.
+        """
+        await Movie.objects.acreate(title="Test Movie", release_date=timezone.now(), image="some path",
+                                    score=0, vote_count=0, overview="some overview")
+        with self.settings(POLLS_PROFILE_TOKEN='secret', POLLS_PROFILE_DIR=self.directory):
+            response = await self.async_client.get(reverse('polls:index'), headers={'X-Profile-Token': 'secret'})
+        name = response['X-Profile-Id']
+        self.assertEqual(self.profiles(), [name + '.json', name + '.prof'])
+        with open(os.path.join(self.directory, name + '.json')) as summary:
+            profile = json.load(summary)
+        self.assertGreater(profile['query_count'], 0)
+        self.assertTrue(any('polls/views.py' in frame for query in profile['queries'] for frame in query['origin']))
+        stats = pstats.Stats(os.path.join(self.directory, name + '.prof')).stats
+        self.assertTrue(any(filename.endswith(os.path.join('polls', 'views.py')) for filename, _, _ in stats))
+
+    def test_token_triggers_profile(self):
+        """
+        A request with the token saves a profile and its SQL.
+        """
+        Movie.objects.create(title="Test Movie", release_date=timezone.now(), image="some path",
+                             score=0, vote_count=0, overview="some overview")
+        with self.settings(POLLS_PROFILE_TOKEN='secret', POLLS_PROFILE_DIR=self.directory):
+            response = self.client.get(reverse('polls:index'), HTTP_X_PROFILE_TOKEN='secret')
+        name = response['X-Profile-Id']
+        self.assertEqual(self.profiles(), [name + '.json', name + '.prof'])
+        with open(os.path.join(self.directory, name + '.json')) as summary:
+            profile = json.load(summary)
+        self.assertEqual(profile['view'], 'polls:index')
+        self.assertGreater(profile['query_count'], 0)
+        self.assertTrue(any('polls/views.py' in frame for query in profile['queries'] for frame in query['origin']))
+
+    def test_rotation_and_summary(self):
+        """
+        Only the most recent profiles are kept and the command summarizes them.
+        """
+        with self.settings(POLLS_PROFILE_SAMPLE_RATE=1, POLLS_PROFILE_DIR=self.directory, POLLS_PROFILE_KEEP=2):
+            for i in range(3):
+                self.client.get(reverse('polls:index'))
+        self.assertEqual(len(self.profiles()), 4)
+        output = io.StringIO()
+        call_command('profile_summary', dir=self.directory, functions=1, stdout=output)
+        self.assertIn('polls:index', output.getvalue())
+
+
+class WarmUpTest(TestCase):
+    def test_warm_up(self):
+        """
+        warm_up() compiles the URL patterns and loads every template.
+        """
+        timings = warmup.warm_up()
+        self.assertGreater(timings['urls'][0], 0)
+        self.assertGreaterEqual(timings['templates'][0], 5)
+        self.assertEqual(timings['catalog'][0], 0)
+
+    @override_settings(POLLS_WARM_UP=False)
+    def test_disabled(self):
+        """
+        Nothing is warmed up unless POLLS_WARM_UP is set.
+        """
+        self.assertIsNone(warmup.warm_up_if_enabled())
+
+
+@override_settings(POLLS_LIVE_RESULTS=True)
+class LiveResultsTest(TestCase):
+    def setUp(self):
+        self.movie = Movie.objects.create(title='Test Movie', release_date=timezone.now(), image="some path",
+                                          score=0, vote_count=0, overview="some overview")
+        self.choice = Choice.objects.create(movie=self.movie, choice=1, votes=0)
+        Choice.objects.create(movie=self.movie, choice=2, votes=0)
+
+    async def test_one_read_for_all_watchers(self):
+        """
+        Every subscriber of a movie gets the histogram from a single read.
+        """
+        broadcaster = ResultsBroadcaster()
+        queues = [broadcaster.subscribe(self.movie.id) for _ in range(5)]
+        broadcaster.task.cancel()
+        await broadcaster.tick()
+        for queue in queues:
+            self.assertEqual(queue.get_nowait(), {'choices': {1: 0, 2: 0}, 'score': 0, 'vote_count': 0})
+
+    async def test_only_changes_are_sent(self):
+        """
+        After the first histogram, subscribers only get what changed.
+        """
+        broadcaster = ResultsBroadcaster()
+        queue = broadcaster.subscribe(self.movie.id)
+        broadcaster.task.cancel()
+        await broadcaster.tick()
+        queue.get_nowait()
+        await broadcaster.tick()
+        self.assertTrue(queue.empty())
+        await Choice.objects.filter(pk=self.choice.pk).aupdate(votes=3)
+        await broadcaster.tick()
+        self.assertEqual(queue.get_nowait(), {'choices': {1: 3}})
+
+    @override_settings(POLLS_LIVE_RESULTS_INTERVAL=0)
+    async def test_poller_survives_errors(self):
+        """
+        A failed read is logged and the poller keeps serving its subscribers.
+        """
+        broadcaster = ResultsBroadcaster()
+        histogram = {'choices': {1: 0}, 'score': 0, 'vote_count': 0}
+        reads = []
+
+        def read_histograms(movie_ids):
+            reads.append(movie_ids)
+            if len(reads) == 1:
+                raise DatabaseError('MySQL server has gone away')
+            return {self.movie.id: histogram}
+
+        with mock.patch('polls.live.read_histograms', read_histograms), self.assertLogs('polls.live', 'ERROR'):
+            queue = broadcaster.subscribe(self.movie.id)
+            self.assertEqual(await asyncio.wait_for(queue.get(), 1), histogram)
+        broadcaster.unsubscribe(self.movie.id, queue)
+        await broadcaster.task
+
+    async def test_unsubscribe(self):
+        """
+        Movies nobody watches any more are no longer read.
+        """
+        broadcaster = ResultsBroadcaster()
+        queue = broadcaster.subscribe(self.movie.id)
+        broadcaster.task.cancel()
+        broadcaster.unsubscribe(self.movie.id, queue)
+        self.assertEqual(dict(broadcaster.subscribers), {})
+
+    async def test_stream(self):
+        """
+        The stream sends the histogram as a server-sent event.
+        """
+        response = await self.async_client.get(reverse('polls:results_stream', args=(self.movie.id,)))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertEqual(await anext(events),
+                         b'data: {"choices": {"1": 0, "2": 0}, "score": 0.0, "vote_count": 0}\n\n')
+        await events.aclose()
+
+    @override_settings(POLLS_LIVE_RESULTS_LIFETIME=0)
+    async def test_stream_lifetime(self):
+        """
+        A stream ends after its lifetime, asking the browser to reconnect.
+        """
+        response = await self.async_client.get(reverse('polls:results_stream', args=(self.movie.id,)))
+        self.assertEqual([chunk async for chunk in response.streaming_content], [b'retry: 1000\n\n'])
+        self.assertEqual(dict(live.broadcaster.subscribers), {})
+
+    def test_stream_needs_asgi(self):
+        """
+        The WSGI application answers 204 so that the browser stops retrying.
+        """
+        response = self.client.get(reverse('polls:results_stream', args=(self.movie.id,)))
+        self.assertEqual(response.status_code, 204)
+
+    @override_settings(POLLS_LIVE_RESULTS=False)
+    async def test_disabled(self):
+        """
+        Without POLLS_LIVE_RESULTS there is no stream and no script to open one.
+        """
+        response = await self.async_client.get(reverse('polls:results_stream', args=(self.movie.id,)))
+        self.assertEqual(response.status_code, 204)
+        response = await self.async_client.get(reverse('polls:results', args=(self.movie.id,)))
+        self.assertNotContains(response, 'EventSource')
+
+    async def test_stream_missing_movie(self):
+        """
+        Streaming the results of a missing movie is a 404.
+        """
+        response = await self.async_client.get(reverse('polls:results_stream', args=(self.movie.id + 1,)))
+        self.assertEqual(response.status_code, 404)
+
+
+class BatchVoteTest(TestCase):
+    def setUp(self):
+        self.movie = Movie.objects.create(title='Test Movie', release_date=timezone.now(), image="some path",
+                                          score=0, vote_count=0, overview="some overview")
+        self.other = Movie.objects.create(title='Other Movie', release_date=timezone.now(), image="some path",
+                                          score=8, vote_count=3, overview="some overview")
+        self.choice4 = Choice.objects.create(movie=self.movie, choice=4, votes=0)
+        self.choice8 = Choice.objects.create(movie=self.movie, choice=8, votes=0)
+        self.other_choice = Choice.objects.create(movie=self.other, choice=2, votes=1)
+
+    def post(self, data):
+        return self.client.post(reverse('polls:vote_batch'), json.dumps(data), content_type='application/json')
+
+    def test_batch_matches_single_votes(self):
+        """
+        A batch leaves the movies and choices as the same votes cast one by one.
+        """
+        response = self.post({'votes': [
+            {'movie_id': self.movie.id, 'choice': self.choice4.id},
+            {'movie_id': self.movie.id, 'choice': self.choice8.id},
+            {'movie_id': self.other.id, 'choice': self.other_choice.id},
+        ]})
+        results = response.json()['results']
+        self.assertEqual([result['ok'] for result in results], [True, True, True])
+        self.assertEqual([(result['score'], result['vote_count']) for result in results],
+                         [(2, 1), (5, 2), (5, 4)])
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.vote_count, 2)
+        self.assertEqual(self.movie.score, ((0 + 4) / 2 + 8) / 2)
+        self.other.refresh_from_db()
+        self.assertEqual((self.other.vote_count, self.other.score), (4, 5))
+        self.assertEqual(list(Choice.objects.order_by('id').values_list('votes', flat=True)), [1, 1, 2])
+
+    def test_invalid_votes_are_reported(self):
+        """
+        Malformed votes and choices of another movie are rejected one by one.
+        """
+        response = self.post({'votes': [
+            {'movie_id': self.movie.id, 'choice': self.other_choice.id},
+            {'movie_id': self.movie.id},
+            {'movie_id': 1e400, 'choice': self.choice4.id},
+            {'movie_id': self.movie.id + 0.9, 'choice': self.choice4.id + 0.5},
+            {'movie_id': str(self.movie.id), 'choice': self.choice4.id},
+            {'movie_id': self.movie.id, 'choice': True},
+            {'movie_id': self.movie.id, 'choice': 10 ** 30},
+            {'movie_id': self.movie.id, 'choice': 0},
+            'not a vote',
+            {'movie_id': self.movie.id, 'choice': self.choice4.id},
+        ]})
+        self.assertEqual([result['ok'] for result in response.json()['results']], [False] * 9 + [True])
+        self.other_choice.refresh_from_db()
+        self.assertEqual(self.other_choice.votes, 1)
+
+    def test_query_count_does_not_grow(self):
+        """
+        A batch runs the same number of queries for one vote or many.
+        """
+        # Validation, locking the movies, their update and the choices update,
+        # plus the savepoint queries of the transaction inside the test case.
+        with self.assertNumQueries(6):
+            self.post({'votes': [{'movie_id': self.movie.id, 'choice': self.choice4.id}]})
+        with self.assertNumQueries(6):
+            self.post({'votes': [{'movie_id': self.movie.id, 'choice': self.choice4.id}] * 20 +
+                                [{'movie_id': self.other.id, 'choice': self.other_choice.id}] * 20})
+
+    def test_bad_request(self):
+        """
+        A body without a votes list is a 400.
+        """
+        self.assertEqual(self.post({'vote': []}).status_code, 400)
+        self.assertEqual(self.post({'votes': []}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('polls:vote_batch')).status_code, 405)
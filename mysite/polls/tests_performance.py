@@ -0,0 +1,179 @@
+"""
+Query-count and render-time budgets for the polls views.
+
+Every view is requested against a seeded catalog and must stay within its
+query budget. The same request is then repeated after the catalog has grown,
+and must issue exactly the same number of queries, so an N+1 query fails the
+suite whatever the budget.
+
+Render times are checked against generous budgets, multiplied by the
+POLLS_PERF_TOLERANCE environment variable (1.0 by default) on slow machines.
+Run the suite on a local SQLite database with:
+
+    DJANGO_TEST_DATABASE=sqlite python manage.py test polls.tests_performance
+"""
+import datetime
+import json
+import os
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import recommendations
+from .models import Choice, Movie
+
+CATALOG_SIZE = 300
+GROWTH = 100
+CHOICES_PER_MOVIE = 10
+TOLERANCE = float(os.environ.get('POLLS_PERF_TOLERANCE', 1.0))
+OVERVIEWS = [
+    'A retired detective returns to the city to hunt a killer who copies his old cases.',
+    'Two astronauts stranded on a distant planet must find a way back to earth.',
+    'A young wizard discovers a hidden school of magic and a dark secret.',
+    'A family road trip turns into a wild comedy of errors across the country.',
+]
+
+
+def seed_movies(start, stop):
+    now = timezone.now()
+    movies = Movie.objects.bulk_create([
+        Movie(title='Movie %d' % i, release_date=now - datetime.timedelta(days=i + 1),
+              image='https://image.tmdb.org/t/p/w1280/poster%d.jpg' % i, score=i % 10, vote_count=i * 7,
+              overview=OVERVIEWS[i % len(OVERVIEWS)])
+        for i in range(start, stop)
+    ])
+    Choice.objects.bulk_create([
+        Choice(movie=movie, choice=choice, votes=0)
+        for movie in movies for choice in range(1, CHOICES_PER_MOVIE + 1)
+    ])
+    return movies
+
+
+@override_settings(POLLS_STREAM_THRESHOLD=None, POLLS_CATALOG=False)
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_movies(0, CATALOG_SIZE)
+        recommendations.rebuild()
+        cls.movie = Movie.objects.order_by('-release_date').first()
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 400)
+        return len(queries)
+
+    def assertQueryBudget(self, budget, method, url, data=None, repeat=None):
+        """
+        Check that the request issues at most budget queries, and exactly as
+        many again once the catalog has grown.
+        """
+        cache.clear()
+        count = self.count_queries(method, url, data)
+        self.assertLessEqual(count, budget, '%s %s issued %d queries, budget is %d' % (method, url, count, budget))
+        seed_movies(CATALOG_SIZE, CATALOG_SIZE + GROWTH)
+        recommendations.rebuild()
+        cache.clear()
+        grown = self.count_queries(method, repeat or url, data)
+        self.assertEqual(count, grown, '%s %s queries grew from %d to %d with the catalog' % (method, url, count, grown))
+
+    def test_index(self):
+        # Three facet queries and the listing itself.
+        self.assertQueryBudget(4, 'get', reverse('polls:index'))
+
+    def test_index_with_filters(self):
+        self.assertQueryBudget(4, 'get', reverse('polls:index'), {'score': '6-8', 'min_votes': 100})
+
+    def test_index_cached_facets(self):
+        self.client.get(reverse('polls:index'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('polls:index'))
+
+    @override_settings(POLLS_STREAM_THRESHOLD=10)
+    def test_streamed_index(self):
+        self.client.get(reverse('polls:index'))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('polls:index'))
+            b''.join(response.streaming_content)
+
+    def test_detail(self):
+        # The movie, its similar movies and its choices.
+        self.assertQueryBudget(3, 'get', reverse('polls:detail', args=(self.movie.id,)))
+
+    def test_results(self):
+        self.assertQueryBudget(2, 'get', reverse('polls:results', args=(self.movie.id,)))
+
+    def test_similar(self):
+        self.assertQueryBudget(2, 'get', reverse('polls:similar', args=(self.movie.id,)))
+
+    def test_movie_list(self):
+        self.assertQueryBudget(1, 'get', reverse('polls:movie_list'), {'year': self.movie.release_date.year})
+
+    def test_vote(self):
+        choice = self.movie.choice_set.first()
+        self.assertQueryBudget(4, 'post', reverse('polls:vote', args=(self.movie.id,)), {'choice': choice.id})
+
+    def test_vote_batch(self):
+        movies = Movie.objects.order_by('id')[:50]
+        votes = [{'movie_id': movie.id, 'choice': choice.id}
+                 for movie in movies.prefetch_related('choice_set') for choice in movie.choice_set.all()[:3]]
+        cache.clear()
+        with CaptureQueriesContext(connection) as one:
+            self.client.post(reverse('polls:vote_batch'), json.dumps({'votes': votes[:1]}),
+                             content_type='application/json')
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(reverse('polls:vote_batch'), json.dumps({'votes': votes}),
+                             content_type='application/json')
+        self.assertLessEqual(len(one), 6)
+        self.assertEqual(len(one), len(many))
+
+    def test_delete(self):
+        movies = list(Movie.objects.order_by('id')[:2])
+        self.assertQueryBudget(4, 'post', reverse('polls:delete', args=(movies[0].id,)),
+                               repeat=reverse('polls:delete', args=(movies[1].id,)))
+
+
+@override_settings(POLLS_STREAM_THRESHOLD=None, POLLS_CATALOG=False)
+class RenderTimeBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_movies(0, CATALOG_SIZE)
+        recommendations.rebuild()
+        cls.movie = Movie.objects.order_by('-release_date').first()
+
+    def assertRenderBudget(self, budget_ms, url, data=None, runs=5):
+        """
+        Check that the fastest of a few runs renders within the budget.
+        """
+        timings = []
+        for _ in range(runs):
+            cache.clear()
+            start = time.perf_counter()
+            response = self.client.get(url, data)
+            timings.append((time.perf_counter() - start) * 1000)
+            self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(min(timings), budget_ms * TOLERANCE,
+                             '%s took %.1f ms, budget is %d ms' % (url, min(timings), budget_ms * TOLERANCE))
+
+    def test_index(self):
+        self.assertRenderBudget(200, reverse('polls:index'))
+
+    def test_index_with_filters(self):
+        self.assertRenderBudget(100, reverse('polls:index'), {'score': '6-8'})
+
+    def test_detail(self):
+        self.assertRenderBudget(50, reverse('polls:detail', args=(self.movie.id,)))
+
+    def test_results(self):
+        self.assertRenderBudget(50, reverse('polls:results', args=(self.movie.id,)))
+
+    def test_movie_list(self):
+        self.assertRenderBudget(100, reverse('polls:movie_list'))
@@ -5,8 +5,12 @@ from . import views
 app_name = 'polls'
 urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
+    path('movies/', views.movie_list, name='movie_list'),
     path('<int:pk>/', views.DetailView.as_view(), name='detail'),
     path('<int:pk>/results/', views.ResultsView.as_view(), name='results'),
+    path('<int:movie_id>/results/live/', views.results_stream, name='results_stream'),
+    path('vote/', views.vote_batch, name='vote_batch'),
     path('<int:movie_id>/vote/', views.vote, name='vote'),
+    path('<int:movie_id>/similar/', views.similar, name='similar'),
     path('<int:movie_id>/delete/', views.delete, name='delete'),
 ]
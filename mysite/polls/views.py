@@ -1,24 +1,83 @@
-from django.http import HttpResponseRedirect
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
+from django.template.loader import get_template
 from django.urls import reverse
 from django.views import generic
+from django.views.decorators.http import require_POST
 from django.utils import timezone
 
+from . import catalog, facets, voting
+from .live import broadcaster
 from .models import Choice, Movie
+from .recommendations import similar_movies
 
 
 class IndexView(generic.ListView):
     template_name = 'polls/index.html'
     context_object_name = 'latest_movie_list'
+    head_template_name = 'polls/index_head.html'
+    cards_template_name = 'polls/movie_cards.html'
+    tail_template_name = 'polls/index_tail.html'
+    stream_chunk_size = 200
 
     def get_queryset(self):
         """
-        Return the last ten published questions (not including those set to be
-        published in the future).
+        Return the published movies (not including those set to be published
+        in the future) that match the filters of the request.
+        """
+        self.filters = facets.parse_filters(self.request.GET)
+        if catalog.enabled():
+            return catalog.get_catalog().movies(self.filters)
+        return facets.filter_queryset(self.get_published(), self.filters).order_by('-release_date')
+
+    def get_published(self):
+        return Movie.objects.filter(release_date__lte=timezone.now())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if catalog.enabled():
+            counts = catalog.get_catalog().facet_counts(self.filters)
+        else:
+            counts = facets.facet_counts(self.get_published(), self.filters)
+        context['facets'] = facets.facet_options(counts, self.filters, self.request.GET)
+        context['filters'] = self.filters
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        """
+        Long listings are streamed: the page head goes out first and the movie
+        cards follow in chunks as they are rendered. This only helps under
+        WSGI; Django 4.2 reads a sync stream into a list before sending it
+        under ASGI, so there the whole page still goes out at once.
         """
-        return Movie.objects.filter(
-            release_date__lte=timezone.now()
-        ).order_by('-release_date')[:]
+        threshold = getattr(settings, 'POLLS_STREAM_THRESHOLD', 500)
+        movies = context['object_list']
+        if threshold is None or (len(movies) if isinstance(movies, list) else movies.count()) <= threshold:
+            return super().render_to_response(context, **response_kwargs)
+        return StreamingHttpResponse(self.stream_content(context), content_type='text/html; charset=utf-8')
+
+    def stream_content(self, context):
+        page_context = {key: value for key, value in context.items()
+                        if key not in ('object_list', self.context_object_name)}
+        cards = get_template(self.cards_template_name)
+        yield get_template(self.head_template_name).render(page_context, self.request)
+        movies = context['object_list']
+        if not isinstance(movies, list):
+            movies = movies.iterator(chunk_size=self.stream_chunk_size)
+        chunk = []
+        for movie in movies:
+            chunk.append(movie)
+            if len(chunk) == self.stream_chunk_size:
+                yield cards.render({'movies': chunk})
+                chunk = []
+        if chunk:
+            yield cards.render({'movies': chunk})
+        yield get_template(self.tail_template_name).render(page_context, self.request)
 
     def index(request):
         movies = Movie.objects.filter(release_date__lte=timezone.now()).order_by('-release_date')
@@ -40,6 +99,11 @@ class DetailView(generic.DetailView):
         """
         return Movie.objects.filter(release_date__lte=timezone.now())
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['similar_movies'] = similar_movies(self.object)
+        return context
+
 
 class ResultsView(generic.DetailView):
     model = Movie
@@ -68,9 +132,97 @@ def vote(request, movie_id):
         return HttpResponseRedirect(reverse('polls:results', args=(movie.id,)))
 
 
+@require_POST
+def vote_batch(request):
+    """
+    Apply many votes at once. The body is JSON:
+    {"votes": [{"movie_id": 1, "choice": 3}, ...]}, where choice is the id of
+    a choice as in vote(). Returns one result per vote.
+    """
+    try:
+        items = json.loads(request.body)['votes']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with a "votes" list.'}, status=400)
+    if not isinstance(items, list) or not 0 < len(items) <= voting.MAX_BATCH_SIZE:
+        return JsonResponse({'error': '"votes" must list 1 to %d votes.' % voting.MAX_BATCH_SIZE}, status=400)
+    results = voting.apply_votes(voting.parse_votes(items))
+    return JsonResponse({'results': results})
+
+
 def results(request, movie_id):
     movie = get_object_or_404(Movie, pk=movie_id)
-    return render(request, 'polls/results.html', {'movie': movie})
+    return render(request, 'polls/results.html', {
+        'movie': movie,
+        'live_results': getattr(settings, 'POLLS_LIVE_RESULTS', False),
+    })
+
+
+async def results_stream(request, movie_id):
+    """
+    Server-sent events with the changes to the results of a movie.
+
+    Streams are only served by the ASGI application with POLLS_LIVE_RESULTS
+    on; otherwise the answer is 204, which stops EventSource reconnecting.
+    Django does not notice clients going away mid-stream, so every stream
+    ends after POLLS_LIVE_RESULTS_LIFETIME seconds with a hint to reconnect.
+    """
+    if not getattr(settings, 'POLLS_LIVE_RESULTS', False) or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    if not await Movie.objects.filter(pk=movie_id).aexists():
+        raise Http404('No movie matches the given query.')
+    keepalive = getattr(settings, 'POLLS_LIVE_RESULTS_KEEPALIVE', 15)
+    lifetime = getattr(settings, 'POLLS_LIVE_RESULTS_LIFETIME', 300)
+
+    async def events():
+        queue = broadcaster.subscribe(movie_id)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + lifetime
+        try:
+            while loop.time() < deadline:
+                try:
+                    changes = await asyncio.wait_for(queue.get(), min(keepalive, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield 'data: %s\n\n' % json.dumps(changes)
+            yield 'retry: %d\n\n' % (getattr(settings, 'POLLS_LIVE_RESULTS_INTERVAL', 1) * 1000)
+        finally:
+            broadcaster.unsubscribe(movie_id, queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def similar(request, movie_id):
+    movie = get_object_or_404(Movie, pk=movie_id)
+    return JsonResponse({
+        'movie': movie.id,
+        'similar': [
+            {'id': other.id, 'title': other.title, 'image': other.image, 'score': other.score}
+            for other in similar_movies(movie)
+        ],
+    })
+
+
+def movie_list(request):
+    """
+    Published movies matching the index filters, newest first, as JSON.
+    """
+    filters = facets.parse_filters(request.GET)
+    if catalog.enabled():
+        movies = catalog.get_catalog().movies(filters)
+    else:
+        movies = facets.filter_queryset(Movie.objects.filter(release_date__lte=timezone.now()), filters) \
+            .order_by('-release_date').only('id', 'title', 'release_date', 'image', 'score', 'vote_count')
+    return JsonResponse({
+        'movies': [
+            {'id': movie.id, 'title': movie.title, 'release_date': movie.release_date, 'image': movie.image,
+             'score': movie.score, 'vote_count': movie.vote_count}
+            for movie in movies
+        ],
+    })
 
 
 def delete(request, movie_id):
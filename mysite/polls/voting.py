@@ -0,0 +1,83 @@
+"""
+Batched voting: many (movie_id, choice) votes applied with a fixed number of
+queries, whatever the size of the batch.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, When
+
+from . import catalog, facets
+from .models import Choice, Movie
+
+MAX_BATCH_SIZE = 500
+MAX_ID = 2 ** 63 - 1
+
+
+def parse_votes(items):
+    """
+    Return the (movie_id, choice_id) pairs of a list of {"movie_id", "choice"}
+    dicts, with None in place of the malformed items. Ids must be JSON
+    integers a database key can hold; floats, booleans and strings are
+    malformed.
+    """
+    votes = []
+    for item in items:
+        try:
+            vote = (item['movie_id'], item['choice'])
+        except (KeyError, TypeError):
+            vote = None
+        if vote is not None and all(type(value) is int and 1 <= value <= MAX_ID for value in vote):
+            votes.append(vote)
+        else:
+            votes.append(None)
+    return votes
+
+
+def apply_votes(votes):
+    """
+    Apply the (movie_id, choice_id) votes in order, as vote() would one by
+    one, and return one result dict per vote. Votes for a choice that does not
+    exist or belongs to another movie are rejected without affecting the rest.
+    Each accepted vote reports the score and vote count of its movie right
+    after that vote, as vote() would have left them.
+    """
+    choice_ids = {vote[1] for vote in votes if vote is not None}
+    choices = {choice_id: (movie_id, value) for choice_id, movie_id, value in
+               Choice.objects.filter(pk__in=choice_ids).values_list('id', 'movie_id', 'choice')}
+    valid = [vote is not None and choices.get(vote[1], (None,))[0] == vote[0] for vote in votes]
+
+    movie_ids = {vote[0] for vote, ok in zip(votes, valid) if ok}
+    with transaction.atomic():
+        movies = {movie.id: movie for movie in
+                  Movie.objects.select_for_update().filter(pk__in=movie_ids).only('id', 'score', 'vote_count')}
+        votes_per_choice = Counter()
+        states = []
+        for vote, ok in zip(votes, valid):
+            if ok:
+                movie = movies[vote[0]]
+                movie.vote_count += 1
+                movie.score = (movie.score + int(choices[vote[1]][1])) / 2
+                votes_per_choice[vote[1]] += 1
+                states.append((movie.score, movie.vote_count))
+        if movies:
+            Movie.objects.bulk_update(movies.values(), ['score', 'vote_count'])
+            Choice.objects.filter(pk__in=votes_per_choice).update(votes=Case(
+                *[When(pk=choice_id, then=F('votes') + count) for choice_id, count in votes_per_choice.items()]))
+            # bulk_update() sends no post_save signal, so record the changes here.
+            catalog.mark_changed(movies)
+            transaction.on_commit(facets.invalidate)
+
+    results = []
+    states = iter(states)
+    for vote, ok in zip(votes, valid):
+        if vote is None:
+            results.append({'ok': False, 'error': 'A vote needs a positive integer movie_id and choice.'})
+        elif not ok:
+            results.append({'movie_id': vote[0], 'choice': vote[1], 'ok': False,
+                            'error': 'No such choice for this movie.'})
+        else:
+            score, vote_count = next(states)
+            results.append({'movie_id': vote[0], 'choice': vote[1], 'ok': True,
+                            'score': score, 'vote_count': vote_count})
+    return results
@@ -0,0 +1,85 @@
+"""
+Worker warm-up.
+
+A new worker compiles its URL patterns and templates, and loads the movie
+catalog, on the first request that needs them. warm_up() does all of that up
+front. It is called from mysite/wsgi.py and mysite/asgi.py when POLLS_WARM_UP
+is set, so servers that load the application before forking (for example
+gunicorn --preload) share the warmed state between all their workers.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+from django.urls import URLResolver, get_resolver
+
+from . import catalog
+
+
+def compile_patterns(resolver):
+    count = 0
+    for pattern in resolver.url_patterns:
+        # The regex of a pattern is compiled on first access.
+        pattern.pattern.regex
+        count += 1
+        if isinstance(pattern, URLResolver):
+            count += compile_patterns(pattern)
+    return count
+
+
+def warm_urls():
+    resolver = get_resolver()
+    count = compile_patterns(resolver)
+    # Build the reverse lookup tables of the root and every namespace.
+    resolver.reverse_dict
+    for _, namespace_resolver in resolver.namespace_dict.values():
+        namespace_resolver.reverse_dict
+    return count
+
+
+def template_names(directory):
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith('.html'):
+                yield os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/')
+
+
+def warm_templates():
+    count = 0
+    for engine in engines.all():
+        directories = list(engine.dirs)
+        if engine.app_dirs:
+            directories += get_app_template_dirs(engine.app_dirname)
+        for directory in directories:
+            for name in template_names(directory):
+                engine.get_template(name)
+                count += 1
+    return count
+
+
+def warm_catalog():
+    if not catalog.enabled():
+        return 0
+    return len(catalog.get_catalog().order)
+
+
+def warm_up():
+    """
+    Compile the URL patterns and templates and load the hot caches. Returns
+    {step: (items, milliseconds)}.
+    """
+    timings = {}
+    for step, function in (('urls', warm_urls), ('templates', warm_templates), ('catalog', warm_catalog)):
+        start = time.perf_counter()
+        timings[step] = (function(), (time.perf_counter() - start) * 1000)
+    # Connections opened while warming up must not be shared with forked workers.
+    connections.close_all()
+    return timings
+
+
+def warm_up_if_enabled():
+    if getattr(settings, 'POLLS_WARM_UP', False):
+        return warm_up()
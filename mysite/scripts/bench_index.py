@@ -0,0 +1,61 @@
+"""
+Bytes-on-wire and time-to-first-byte of the movie index.
+
+Run with: python manage.py runscript bench_index
+
+The movies are created inside a transaction that is rolled back at the end,
+so the benchmark leaves the database untouched.
+"""
+import datetime
+import time
+
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Movie
+
+SIZES = (1000, 10000)
+ENCODINGS = ('identity', 'gzip', 'br')
+OVERVIEW = 'A group of friends set out on a journey that will change their lives forever.'
+
+
+def create_movies(start, stop):
+    now = timezone.now()
+    Movie.objects.bulk_create([
+        Movie(title='Benchmark movie %d' % i, release_date=now - datetime.timedelta(days=i),
+              image='https://image.tmdb.org/t/p/w1280/poster%d.jpg' % i, score=5.0, vote_count=0,
+              overview=OVERVIEW)
+        for i in range(start, stop)
+    ], batch_size=1000)
+
+
+def measure(client, url, encoding):
+    start = time.perf_counter()
+    response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+    if response.streaming:
+        chunks = iter(response.streaming_content)
+        body = next(chunks, b'')
+        first_byte = time.perf_counter() - start
+        body += b''.join(chunks)
+    else:
+        body = response.content
+        first_byte = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return response.get('Content-Encoding', 'identity'), len(body), first_byte, total
+
+
+def run():
+    client = Client(HTTP_HOST='localhost')
+    url = reverse('polls:index')
+    print('%8s %10s %12s %10s %10s' % ('movies', 'encoding', 'bytes', 'ttfb ms', 'total ms'))
+    with transaction.atomic():
+        created = 0
+        for size in SIZES:
+            create_movies(created, size)
+            created = size
+            for encoding in ENCODINGS:
+                used, size_bytes, first_byte, total = measure(client, url, encoding)
+                print('%8d %10s %12d %10.1f %10.1f' % (size, used, size_bytes, first_byte * 1000, total * 1000))
+        transaction.set_rollback(True)
@@ -0,0 +1,57 @@
+"""
+Password checks (the CPU cost of a login) per second, run inline, in the
+thread pool used by the async login view and in a process pool.
+
+Run with: python manage.py runscript bench_logins
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import check_password, make_password
+
+from accounts import hashing
+
+DURATION = 5
+PASSWORD = 'correct horse battery staple'
+
+
+def inline(encoded):
+    count = 0
+    deadline = time.perf_counter() + DURATION
+    while time.perf_counter() < deadline:
+        check_password(PASSWORD, encoded)
+        count += 1
+    return count
+
+
+async def in_thread_pool(encoded):
+    count = 0
+    deadline = time.perf_counter() + DURATION
+
+    async def worker():
+        nonlocal count
+        while time.perf_counter() < deadline:
+            await hashing.acheck_password(PASSWORD, encoded)
+            count += 1
+
+    await asyncio.gather(*(worker() for _ in range(hashing.get_executor()._max_workers)))
+    return count
+
+
+def in_process_pool(encoded):
+    cores = os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=cores) as executor:
+        return sum(executor.map(inline, [encoded] * cores))
+
+
+def run():
+    encoded = make_password(PASSWORD)
+    cores = os.cpu_count() or 1
+    print('%d cores, %.1f s per run' % (cores, DURATION))
+    for name, checks, used in (
+            ('inline', inline(encoded), 1),
+            ('thread pool', asyncio.run(in_thread_pool(encoded)), hashing.get_executor()._max_workers),
+            ('process pool', in_process_pool(encoded), cores)):
+        print('%-14s %8.1f logins/s %8.1f logins/s/core' % (name, checks / DURATION, checks / DURATION / used))
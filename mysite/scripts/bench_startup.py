@@ -0,0 +1,57 @@
+"""
+Worker startup time: how long it takes to import the WSGI application and
+to serve the first request, with and without the production profile and the
+warm-up step.
+
+Run with: python manage.py runscript bench_startup
+
+Every measurement starts a fresh Python process, as a new worker would.
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+
+RUNS = 5
+URLS = ('/polls/', '/accounts/login/')
+PROFILES = (
+    ('development', '0'),
+    ('production', '0'),
+    ('production', '1'),
+)
+
+WORKER = '''
+import sys
+import time
+from wsgiref.util import setup_testing_defaults
+
+start = time.perf_counter()
+from mysite.wsgi import application
+loaded = time.perf_counter()
+
+environ = {'PATH_INFO': sys.argv[1], 'HTTP_HOST': 'localhost'}
+setup_testing_defaults(environ)
+b''.join(application(environ, lambda status, headers: None))
+print(loaded - start, time.perf_counter() - loaded)
+'''
+
+
+def measure(url, django_env, warm_up):
+    env = dict(os.environ, DJANGO_ENV=django_env, POLLS_WARM_UP=warm_up)
+    output = subprocess.run([sys.executable, '-c', WORKER, url], cwd=settings.BASE_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    import_time, first_request = output.split()
+    return float(import_time) * 1000, float(first_request) * 1000
+
+
+def run():
+    print('%-16s %-12s %8s %12s %18s' % ('url', 'env', 'warm-up', 'import ms', 'first request ms'))
+    for url in URLS:
+        for django_env, warm_up in PROFILES:
+            timings = [measure(url, django_env, warm_up) for _ in range(RUNS)]
+            print('%-16s %-12s %8s %12.1f %18.1f' % (
+                url, django_env, 'yes' if warm_up == '1' else 'no',
+                statistics.median(import_time for import_time, _ in timings),
+                statistics.median(first_request for _, first_request in timings)))
@@ -0,0 +1,51 @@
+"""
+Votes per second: N single votes (one POST and redirect each) against one
+batch of N votes.
+
+Run with: python manage.py runscript bench_votes
+
+The movies are created inside a transaction that is rolled back at the end,
+so the benchmark leaves the database untouched.
+"""
+import json
+import time
+
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Movie
+
+SIZES = (10, 100, 500)
+
+
+def create_votes(count):
+    now = timezone.now()
+    movies = Movie.objects.bulk_create([
+        Movie(title='Benchmark movie %d' % i, release_date=now, image=' ', score=5.0, vote_count=0, overview=' ')
+        for i in range(count)
+    ])
+    choices = Choice.objects.bulk_create([Choice(movie=movie, choice=7, votes=0) for movie in movies])
+    return [(choice.movie_id, choice.id) for choice in choices]
+
+
+def run():
+    client = Client(HTTP_HOST='localhost')
+    print('%6s %16s %16s %8s' % ('votes', 'single votes/s', 'batch votes/s', 'speedup'))
+    with transaction.atomic():
+        for size in SIZES:
+            votes = create_votes(size)
+            start = time.perf_counter()
+            for movie_id, choice_id in votes:
+                client.post(reverse('polls:vote', args=(movie_id,)), {'choice': choice_id})
+            single = time.perf_counter() - start
+
+            start = time.perf_counter()
+            client.post(reverse('polls:vote_batch'),
+                        json.dumps({'votes': [{'movie_id': movie_id, 'choice': choice_id}
+                                              for movie_id, choice_id in votes]}),
+                        content_type='application/json')
+            batch = time.perf_counter() - start
+            print('%6d %16.0f %16.0f %7.1fx' % (size, size / single, size / batch, single / batch))
+        transaction.set_rollback(True)